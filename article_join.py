@@ -0,0 +1,102 @@
+"""
+Article Join
+WordPress記事・GA4記事別データ・GSCページ別データを1記事1行に統合
+"""
+
+from urllib.parse import unquote
+import pandas as pd
+
+
+def normalize_paths(urls):
+    """URLまたはパスを比較用のパスに正規化（ベクトル化）
+
+    スキーム・ホスト・クエリ・フラグメントを除去し、%エンコードを戻して
+    小文字化、先頭と末尾のスラッシュを揃える
+    例: https://machiyomi-fudosan.com/Foo/?utm=x#top → /foo/
+    """
+    s = pd.Series(urls, dtype='string').fillna('')
+    s = s.str.replace(r'^https?://[^/]+', '', regex=True)
+    s = s.str.replace(r'[?#].*$', '', regex=True)
+    encoded = s.str.contains('%', regex=False)
+    if encoded.any():
+        s[encoded] = s[encoded].map(unquote)
+    s = s.str.lower().str.strip()
+    s = s.str.replace(r'/{2,}', '/', regex=True)
+    s = s.where(s.str.startswith('/'), '/' + s)
+    s = s.where(s.str.endswith('/'), s + '/')
+    return s
+
+
+def build_path_index(articles):
+    """パス → 記事IDの索引を作成
+
+    パーマリンクのパスに加えて、/スラッグ/ と /記事ID/ も同じ記事に対応させる
+    （GA4の pagePath は /123/ 形式で記録されていることがある）
+    """
+    posts = pd.DataFrame(articles)
+    aliases = pd.concat([
+        pd.DataFrame({'path': normalize_paths(posts['リンク']).values, 'ID': posts['ID'].values}),
+        pd.DataFrame({'path': normalize_paths(posts['スラッグ']).values, 'ID': posts['ID'].values}),
+        pd.DataFrame({'path': normalize_paths(posts['ID']).values, 'ID': posts['ID'].values}),
+    ], ignore_index=True)
+    # 同じパスが複数記事に当たる場合はパーマリンク（先頭）を優先
+    return aliases.drop_duplicates('path').set_index('path')['ID']
+
+
+def _weighted_mean(df, value_col, weight_col):
+    """記事IDごとの加重平均"""
+    weighted = (df[value_col].astype('float64') * df[weight_col]).groupby(df['ID']).sum()
+    weights = df[weight_col].groupby(df['ID']).sum()
+    return (weighted / weights.where(weights > 0)).round(1)
+
+
+def join_articles(articles, ga_articles, gsc_pages):
+    """記事単位の統合テーブルを作成
+
+    articles: sync_articles.build_articles / load_articles の結果
+    ga_articles: GA4Client.get_article_performance の結果（pagePath）
+    gsc_pages: SearchConsoleClient.get_page_performance の結果（page）
+
+    パスを正規化してハッシュ結合するため、記事数に対して線形に処理できる
+    """
+    columns = [
+        'ID', 'タイトル', '日付', 'カテゴリ', 'リンク', 'PV数', '平均滞在時間(秒)',
+        'クリック数', '表示回数', 'CTR(%)', '平均順位', '内部リンク数', '外部リンク数'
+    ]
+    if not articles:
+        return pd.DataFrame(columns=columns)
+
+    index = build_path_index(articles)
+    posts = pd.DataFrame(articles).set_index('ID')
+
+    table = pd.DataFrame(index=posts.index)
+
+    if not ga_articles.empty:
+        ga = ga_articles.assign(ID=normalize_paths(ga_articles['pagePath']).map(index).values)
+        ga = ga.dropna(subset=['ID'])
+        table['PV数'] = ga.groupby('ID')['screenPageViews'].sum()
+        table['平均滞在時間(秒)'] = _weighted_mean(ga, 'averageSessionDuration', 'screenPageViews')
+
+    if not gsc_pages.empty:
+        gsc = gsc_pages.assign(ID=normalize_paths(gsc_pages['page']).map(index).values)
+        gsc = gsc.dropna(subset=['ID'])
+        grouped = gsc.groupby('ID')[['clicks', 'impressions']].sum()
+        table['クリック数'] = grouped['clicks']
+        table['表示回数'] = grouped['impressions']
+        table['平均順位'] = _weighted_mean(gsc, 'position', 'impressions')
+
+    table = table.reindex(columns=['PV数', '平均滞在時間(秒)', 'クリック数', '表示回数', '平均順位'])
+    for col in ['PV数', 'クリック数', '表示回数']:
+        table[col] = table[col].fillna(0).astype('int64')
+    impressions = table['表示回数'].where(table['表示回数'] > 0)
+    table['CTR(%)'] = (table['クリック数'] / impressions * 100).round(2)
+
+    table['タイトル'] = posts['タイトル']
+    table['日付'] = posts['日付'].str[:10]
+    table['カテゴリ'] = posts['カテゴリ']
+    table['リンク'] = posts['リンク']
+    table['内部リンク数'] = posts['内'].astype('int64')
+    table['外部リンク数'] = posts['外'].astype('int64')
+
+    table = table.reset_index()
+    return table[columns].sort_values(['PV数', 'クリック数'], ascending=False).reset_index(drop=True)
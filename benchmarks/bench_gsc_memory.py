@@ -0,0 +1,132 @@
+"""
+GSC行データのメモリ使用量ベンチマーク
+
+旧方式（行ごとの辞書リスト → object型DataFrame）と
+新方式（ページ単位で列に直接デコード → カテゴリ型・int32・float32）の
+ピークRSSを比較する。どちらも同じ25,000行単位のページングで取得し、
+デコード方式・型の違いだけを比べる。各方式は別プロセスで計測する。
+
+Usage:
+    python benchmarks/bench_gsc_memory.py            # 100万行
+    python benchmarks/bench_gsc_memory.py --rows 200000
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+AREAS = ['札幌', '仙台', '東京', '横浜', '川崎', '名古屋', '京都', '大阪', '神戸', '広島', '福岡', '那覇']
+WORDS = ['中古マンション', '土地 売却', '相場', '一戸建て', '賃貸', '査定', '住みやすさ', '地価', '新築', '治安']
+
+
+def make_row(i):
+    """APIレスポンス1行分を生成（約40万種類のクエリ、5千ページ）"""
+    q = (i * 7919) % 400000
+    return {
+        'keys': [
+            f'https://machiyomi-fudosan.com/{i % 5000}/',
+            f'{AREAS[q % len(AREAS)]} {WORDS[(q // len(AREAS)) % len(WORDS)]} {q // 120}丁目',
+        ],
+        'clicks': i % 7,
+        'impressions': 10 + i % 300,
+        'ctr': (i % 7) / (10 + i % 300),
+        'position': 1 + (i % 900) / 10,
+    }
+
+
+class FakeQuery:
+    def __init__(self, body, total_rows):
+        self.body = body
+        self.total_rows = total_rows
+
+    def execute(self):
+        start = self.body['startRow']
+        end = min(start + self.body['rowLimit'], self.total_rows)
+        return {'rows': [make_row(i) for i in range(start, end)]}
+
+
+class FakeService:
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+
+    def searchanalytics(self):
+        return self
+
+    def query(self, siteUrl, body):
+        return FakeQuery(body, self.total_rows)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_legacy(total_rows):
+    """旧方式: 同じく25,000行ずつ取得し、行ごとの辞書リストからDataFrameを作成"""
+    import pandas as pd
+    from search_console_client import API_ROW_LIMIT
+
+    service = FakeService(total_rows)
+    data = []
+    for start in range(0, total_rows, API_ROW_LIMIT):
+        rows = service.query(None, {'startRow': start, 'rowLimit': API_ROW_LIMIT}).execute()['rows']
+        for row in rows:
+            data.append({
+                'page': row['keys'][0],
+                'query': row['keys'][1],
+                'clicks': row['clicks'],
+                'impressions': row['impressions'],
+                'ctr': round(row['ctr'] * 100, 2),
+                'position': round(row['position'], 1)
+            })
+        del rows
+    df = pd.DataFrame(data)
+    del data
+    return df
+
+
+def run_compact(total_rows):
+    """新方式: SearchConsoleClient.fetch_rows でページごとに列へデコード"""
+    from search_console_client import SearchConsoleClient
+
+    client = SearchConsoleClient.__new__(SearchConsoleClient)
+    client.service = FakeService(total_rows)
+    client.site_url = 'https://machiyomi-fudosan.com/'
+    return client.fetch_rows(['page', 'query'])
+
+
+def child(mode, total_rows):
+    import pandas  # noqa: F401  インポート分をベースラインに含める
+    import time
+    import response_cache
+
+    # 生成した行を data/response_cache に残さない
+    response_cache.configure(bypass=True)
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    df = run_legacy(total_rows) if mode == 'legacy' else run_compact(total_rows)
+    elapsed = time.perf_counter() - start
+    frame_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+    print(f'{mode:8s} rows={len(df):,} peak_rss=+{peak_rss_mb() - base:,.0f}MB '
+          f'frame={frame_mb:,.0f}MB time={elapsed:.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GSC行データのメモリ使用量ベンチマーク')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--mode', choices=['legacy', 'compact'])
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args.mode, args.rows)
+        return
+
+    for mode in ['legacy', 'compact']:
+        subprocess.run([sys.executable, __file__, '--mode', mode, '--rows', str(args.rows)], check=True)
+
+
+if __name__ == '__main__':
+    main()
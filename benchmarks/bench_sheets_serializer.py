@@ -0,0 +1,89 @@
+"""
+Sheets書き込みデータ変換のベンチマーク
+
+旧方式（df.values.tolist() → セルごとに日付・欠損を判定 → _cell_data）と
+新方式（列ごとに重複を除いて変換する sheets_client.frame_cells / iter_frame_cells）の
+変換時間を比較し、両者の結果が一致することを確認する。
+
+Usage:
+    python benchmarks/bench_sheets_serializer.py             # 10万行×10列
+    python benchmarks/bench_sheets_serializer.py --rows 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sheets_client import _cell_data, frame_cells, iter_frame_cells, WRITE_CHUNK_ROWS  # noqa: E402
+
+AREAS = ['札幌', '仙台', '東京', '横浜', '川崎', '名古屋', '京都', '大阪', '神戸', '広島', '福岡', '那覇']
+
+
+def make_frame(rows):
+    """シートに書き込む表と同じ型構成のDataFrame（10列）を生成"""
+    rng = np.random.default_rng(0)
+    ctr = rng.uniform(0, 30, rows).round(2)
+    ctr[::50] = np.nan
+    return pd.DataFrame({
+        '日付': pd.date_range('2020-01-01', periods=rows, freq='h'),
+        '検索クエリ': pd.Categorical([f'{AREAS[i % len(AREAS)]} 相場 {i // 12}' for i in range(rows)]),
+        'URL': [f'https://machiyomi-fudosan.com/{i % 5000}/' for i in range(rows)],
+        'PV数': rng.integers(0, 10000, rows),
+        'クリック数': rng.integers(0, 500, rows).astype(np.int32),
+        '表示回数': rng.integers(0, 50000, rows).astype(np.int32),
+        'CTR(%)': ctr,
+        '平均順位': rng.uniform(1, 100, rows).round(1).astype(np.float32),
+        '平均滞在時間(秒)': rng.uniform(0, 600, rows).round(1),
+        '速報値': np.where(np.arange(rows) % 7 == 0, '速報', ''),
+    })
+
+
+def legacy_cells(df):
+    """旧方式: セルごとにPythonで判定"""
+    float32_cols = df.select_dtypes(include='float32').columns
+    if len(float32_cols):
+        df = df.copy()
+        df[float32_cols] = df[float32_cols].astype(str).astype('float64')
+
+    data = df.values.tolist()
+    for i, row in enumerate(data):
+        for j, cell in enumerate(row):
+            if isinstance(cell, (datetime, pd.Timestamp)):
+                data[i][j] = cell.strftime('%Y-%m-%d')
+            elif pd.isna(cell):
+                data[i][j] = ''
+    return [{'values': [_cell_data(v) for v in row]} for row in data]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sheets書き込みデータ変換のベンチマーク')
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    legacy, legacy_time = timed(legacy_cells, df)
+    vectorized, vectorized_time = timed(frame_cells, df)
+    chunked, chunked_time = timed(lambda d: [r for c in iter_frame_cells(d, WRITE_CHUNK_ROWS) for r in c], df)
+
+    print(f'rows={len(df):,} cols={len(df.columns)}')
+    print(f'legacy     {legacy_time:6.2f}s')
+    print(f'vectorized {vectorized_time:6.2f}s ({legacy_time / vectorized_time:.1f}x)')
+    print(f'chunked    {chunked_time:6.2f}s ({legacy_time / chunked_time:.1f}x, {WRITE_CHUNK_ROWS:,}行ずつ)')
+    print(f'同一結果: {legacy == vectorized == chunked}')
+
+
+if __name__ == '__main__':
+    main()
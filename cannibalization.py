@@ -0,0 +1,94 @@
+"""
+Keyword Cannibalization
+同じ検索クエリで複数の自サイトページが表示回数・クリックを分け合っているケースを検出
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from article_join import normalize_paths
+
+# 入力（page×query データ）で使う列
+COLUMNS_IN = ['query', 'page', 'clicks', 'impressions']
+COLUMNS = ['検索クエリ', '競合ページ数', '表示回数', 'クリック数', '推定損失クリック', '最良CTR(%)', '競合ページ']
+
+
+def _competing_from_dataset(dataset, min_share, min_impressions):
+    """spill_rows の dataset から競合候補の行と、その行のクエリの合計表示回数を取得
+
+    クエリごとの合計は辞書のインデックス（整数）で集計し、DataFrame にするのは候補の行だけ
+    """
+    table = dataset.to_table(columns=COLUMNS_IN, filter=pc.field('impressions') > 0)
+    if not pa.types.is_dictionary(table.schema.field('query').type):
+        table = table.set_column(0, 'query', table.column('query').dictionary_encode())
+    table = table.unify_dictionaries()
+    if table.num_rows == 0:
+        return table.to_pandas(), pd.Series(dtype=np.int64)
+
+    codes = np.concatenate([chunk.indices.to_numpy(zero_copy_only=False)
+                            for chunk in table.column('query').chunks])
+    impressions = table.column('impressions').to_numpy().astype(np.int64)
+    total = np.bincount(codes, weights=impressions).astype(np.int64)[codes]
+    competing = (impressions >= total * min_share) & (total >= min_impressions)
+    df = table.filter(pa.array(competing)).to_pandas()
+    return df, pd.Series(total[competing], index=df.index)
+
+
+def detect_cannibalization(page_queries, min_share=0.1, min_impressions=20, top=200):
+    """page×query データからカニバリゼーションを検出
+
+    表示回数のシェアが min_share 以上のページが2つ以上あるクエリを対象とし、
+    「全表示回数が最もCTRの高いページに集まった場合のクリック数 − 実際のクリック数」を
+    推定損失クリックとしてスコアにする。集計は groupby のみで行うため100万行でも数秒で終わる
+    page_queries は DataFrame、または SearchConsoleClient.spill_rows の pyarrow.dataset
+    （dataset の場合は必要な4列だけを読み込み、候補の行だけを DataFrame にする）
+    """
+    if isinstance(page_queries, ds.Dataset):
+        df, total = _competing_from_dataset(page_queries, min_share, min_impressions)
+    else:
+        df = page_queries.loc[page_queries['impressions'] > 0, COLUMNS_IN]
+        total = df['impressions'].astype(np.int64).groupby(df['query'], observed=True).transform('sum')
+        competing = (df['impressions'] >= total * min_share) & (total >= min_impressions)
+        df, total = df[competing], total[competing]
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    impressions = df['impressions'].astype(np.int64)
+    df = df.assign(
+        share=impressions / total,
+        ctr=df['clicks'] / impressions,
+    )
+
+    stats = df.groupby('query', observed=True).agg(
+        pages=('page', 'size'),
+        impressions=('impressions', 'sum'),
+        clicks=('clicks', 'sum'),
+        best_ctr=('ctr', 'max'),
+    )
+    stats = stats[stats['pages'] >= 2]
+    if stats.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    stats['lost'] = (stats['impressions'] * stats['best_ctr'] - stats['clicks']).clip(lower=0)
+    cases = stats.nlargest(top, 'lost')
+
+    # 上位ケースだけ競合ページの一覧文字列を作る
+    detail = df[df['query'].isin(cases.index)].sort_values('share', ascending=False)
+    detail = detail.assign(
+        label=normalize_paths(detail['page'].astype(str)).values
+        + ' (' + (detail['share'] * 100).round(0).astype(int).astype(str).values + '%)'
+    )
+    page_lists = detail.groupby('query', observed=True)['label'].agg(' / '.join)
+
+    result = pd.DataFrame({
+        '検索クエリ': cases.index.astype(str),
+        '競合ページ数': cases['pages'].to_numpy(),
+        '表示回数': cases['impressions'].to_numpy(),
+        'クリック数': cases['clicks'].to_numpy(),
+        '推定損失クリック': cases['lost'].round(1).to_numpy(),
+        '最良CTR(%)': (cases['best_ctr'] * 100).round(2).to_numpy(),
+        '競合ページ': page_lists.reindex(cases.index).to_numpy(),
+    })
+    return result[COLUMNS]
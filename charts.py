@@ -5,35 +5,53 @@ Google Sheets Chart Creator
 
 import config
 from auth import get_sheets_client
+from sheets_client import SheetIndex
 
 
-def create_charts(spreadsheet_id):
-    """全シートにグラフを作成"""
-    client = get_sheets_client()
-    spreadsheet = client.open_by_key(spreadsheet_id)
+def create_charts(spreadsheet_id, index=None):
+    """全シートにグラフを作成（同じタイトルのグラフがあるシートは、データ範囲が変わったときだけ更新）
+
+    index: sheets_client.SheetIndex（SheetsClient と共有してメタデータの再取得を省く）
+    """
+    if index is None:
+        client = get_sheets_client()
+        index = SheetIndex.open(client, spreadsheet_id)
 
     # 各シートのIDを取得
-    sheet_ids = {}
-    for sheet in spreadsheet.worksheets():
-        sheet_ids[sheet.title] = sheet.id
+    sheet_ids = {title: ws.id for title, ws in index.worksheets().items()}
 
     requests = []
+    resized = []
+    updated = []
+
+    def add_chart(sheet_key, chart):
+        sheet_name = config.SHEETS[sheet_key]
+        worksheet = index.worksheet(sheet_name)
+        spec = chart['addChart']['chart']['spec']
+        _clip_sources(worksheet, spec)
+        existing = index.chart(sheet_name, spec['title'])
+        if existing is None:
+            requests.extend(_fit_grid(worksheet, chart, resized))
+            requests.append(chart)
+        elif _source_end_rows(existing['spec']) != _source_end_rows(spec):
+            # 既存グラフのデータ範囲が前回の行数で切り詰められている場合などは範囲を更新する
+            requests.append({'updateChartSpec': {'chartId': existing['chartId'], 'spec': spec}})
+            updated.append((existing, spec))
 
     # 1. 日別PV推移グラフ（折れ線）
     if config.SHEETS['daily_pv'] in sheet_ids:
-        requests.append(create_line_chart(
+        add_chart('daily_pv', create_line_chart(
             sheet_id=sheet_ids[config.SHEETS['daily_pv']],
             title="📈 日別PV推移（全期間）",
             x_col=0,  # 日付
             y_cols=[1, 2],  # PV数, セッション数
             start_row=1,
-            end_row=130,
             position_col=6
         ))
 
     # 2. 記事別PVグラフ（横棒）
     if config.SHEETS['article_performance'] in sheet_ids:
-        requests.append(create_bar_chart(
+        add_chart('article_performance', create_bar_chart(
             sheet_id=sheet_ids[config.SHEETS['article_performance']],
             title="📊 記事別PV数 TOP20",
             label_col=1,  # 記事タイトル
@@ -45,7 +63,7 @@ def create_charts(spreadsheet_id):
 
     # 3. 検索クエリグラフ（横棒）
     if config.SHEETS['search_queries'] in sheet_ids:
-        requests.append(create_bar_chart(
+        add_chart('search_queries', create_bar_chart(
             sheet_id=sheet_ids[config.SHEETS['search_queries']],
             title="🔍 検索クエリ TOP20",
             label_col=0,  # クエリ
@@ -57,25 +75,78 @@ def create_charts(spreadsheet_id):
 
     # 4. トレンド分析グラフ（折れ線 - クリック数と表示回数）
     if config.SHEETS['trends'] in sheet_ids:
-        requests.append(create_line_chart(
+        add_chart('trends', create_line_chart(
             sheet_id=sheet_ids[config.SHEETS['trends']],
             title="📉 検索パフォーマンス推移（全期間）",
             x_col=0,  # 日付
             y_cols=[5, 6],  # クリック数, 表示回数
             start_row=1,
-            end_row=130,
             position_col=10
         ))
 
     # バッチリクエスト実行
     if requests:
         body = {'requests': requests}
-        spreadsheet.batch_update(body)
-        print(f"✅ {len(requests)}個のグラフを作成しました")
+        response = index.spreadsheet.batch_update(body)
+        index.add_charts(response.get('replies', []))
+        for grid, count_key, count in resized:
+            grid[count_key] = count
+        for existing, spec in updated:
+            existing['spec'] = spec
+        charts = sum('addChart' in r for r in requests)
+        if charts:
+            print(f"✅ {charts}個のグラフを作成しました")
+        if updated:
+            print(f"✅ {len(updated)}個のグラフのデータ範囲を更新しました")
+    else:
+        print("  → グラフは作成済みです")
+
+
+def _chart_sources(spec):
+    basic = spec.get('basicChart', {})
+    for axis in basic.get('domains', []) + basic.get('series', []):
+        key = 'domain' if 'domain' in axis else 'series'
+        yield from axis.get(key, {}).get('sourceRange', {}).get('sources', [])
+
+
+def _source_end_rows(spec):
+    """グラフのデータ範囲の終了行（終了行のない範囲は None）"""
+    return [source.get('endRowIndex') for source in _chart_sources(spec)]
+
 
+def _clip_sources(worksheet, spec):
+    """終了行を指定したデータ範囲を実際の行数までに切り詰める
 
-def create_line_chart(sheet_id, title, x_col, y_cols, start_row, end_row, position_col):
-    """折れ線グラフを作成"""
+    全期間のグラフは終了行を指定しない（列全体を参照する）ため、行数が変わっても範囲は変わらない
+    """
+    for source in _chart_sources(spec):
+        if 'endRowIndex' in source:
+            source['endRowIndex'] = min(source['endRowIndex'], worksheet.row_count)
+
+
+def _fit_grid(worksheet, chart, resized):
+    """アンカーセルがグリッド外なら列・行を追加するリクエストを返す
+
+    追加後のサイズは resized に (gridProperties, キー, 値) で追加し、送信が成功した後に反映する
+    """
+    anchor = chart['addChart']['chart']['position']['overlayPosition']['anchorCell']
+    grid = worksheet._properties['gridProperties']
+    requests = []
+    for dimension, needed, count_key in [
+        ('ROWS', anchor['rowIndex'] + 1, 'rowCount'),
+        ('COLUMNS', anchor['columnIndex'] + 1, 'columnCount'),
+    ]:
+        current = grid[count_key]
+        if needed > current:
+            requests.append({'appendDimension': {
+                'sheetId': worksheet.id, 'dimension': dimension, 'length': needed - current
+            }})
+            resized.append((grid, count_key, needed))
+    return requests
+
+
+def create_line_chart(sheet_id, title, x_col, y_cols, start_row, position_col):
+    """折れ線グラフを作成（データ範囲は start_row 以降の列全体）"""
     series = []
     for y_col in y_cols:
         series.append({
@@ -84,7 +155,6 @@ def create_line_chart(sheet_id, title, x_col, y_cols, start_row, end_row, positi
                     'sources': [{
                         'sheetId': sheet_id,
                         'startRowIndex': start_row,
-                        'endRowIndex': end_row,
                         'startColumnIndex': y_col,
                         'endColumnIndex': y_col + 1
                     }]
@@ -111,7 +181,6 @@ def create_line_chart(sheet_id, title, x_col, y_cols, start_row, end_row, positi
                                     'sources': [{
                                         'sheetId': sheet_id,
                                         'startRowIndex': start_row,
-                                        'endRowIndex': end_row,
                                         'startColumnIndex': x_col,
                                         'endColumnIndex': x_col + 1
                                     }]
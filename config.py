@@ -19,6 +19,53 @@ CREDENTIALS_FILE = "credentials.json"
 # レポート期間設定
 REPORT_DAYS = 120  # 過去120日分のデータを取得（10月6日〜全期間）
 
+# 記事別・ページ別データの最大取得行数（記事統合シートで全記事を結合するため）
+ARTICLE_LIMIT = 10000
+
+# 記事別パフォーマンスシート・静的ダッシュボードに載せる記事数（PVの多い順）
+ARTICLE_TOP_LIMIT = 100
+
+# ページ×クエリ別データの最大取得行数（キーワード競合の検出用、None で全件）
+PAGE_QUERY_LIMIT = 200000
+
+# 検索クエリの最大取得行数（クエリクラスタの集計用、None で全件）
+QUERY_LIMIT = 200000
+
+# ローカルデータ保存先（取得済みデータをParquetで保存）
+DATA_DIR = "data"
+
+# 検索順位の日次アーカイブ（rank_archive.py）
+RANK_ARCHIVE_BACKFILL_DAYS = 7   # 毎回さかのぼって未保存の日を埋める日数
+RANK_ARCHIVE_LIMIT = 200000      # 1日あたりの最大取得行数（クエリ・ページそれぞれ）
+
+# GA4の多次元キューブ（日付×時間帯、日付×デバイス×流入元）を取得し、
+# 日別PV・時間帯別・曜日別・流入元・デバイスをローカルで集計する（APIリクエスト5回 → 2回）
+# ユーザー数・平均滞在時間は足し合わせた概算値になる
+GA4_CUBES = False
+# 記事別の日別PVキューブも取得する（local_query.py で記事・カテゴリ別のPVを問い合わせる場合のみ。GA4のレポートが1回増える）
+GA4_PAGE_CUBE = False
+GA4_FINAL_LAG_DAYS = 2  # GA4の値が確定するまでの日数（直近は速報値として保存し、次回取り直す）
+
+# APIレスポンスのキャッシュ（response_cache.py）
+# 取得元ごとの有効期限（秒）。この時間内の再実行では同じリクエストをAPIに送らない
+RESPONSE_CACHE_TTL = {
+    "ga4": 3600,
+    "gsc": 3600,
+    "wordpress": 600,
+}
+RESPONSE_CACHE_MAX_MB = 200  # 超えたら最後に使った時刻の古いものから削除
+
+# 静的ダッシュボードの書き出し先（serve_dashboard.py で配信）
+EXPORT_DIR = "public"
+
+# Search Consoleの確定データまでの日数（これより新しい日は速報値として保存し、確定後に再取得）
+GSC_FINAL_LAG_DAYS = 3
+
+# 古い日別行の集約（日別PV・トレンド分析シート）
+# ROLLUP_FREQ: 'W'（週単位）/ 'M'（月単位）/ None（集約しない）
+ROLLUP_FREQ = None
+ROLLUP_AFTER_DAYS = 180  # これより古い日別行を集約
+
 # シート名設定
 SHEETS = {
     "daily_pv": "日別PV",
@@ -26,5 +73,9 @@ SHEETS = {
     "search_queries": "検索クエリ",
     "trends": "トレンド分析",
     "summary": "サマリー",
-    "time_analysis": "時間帯分析"
+    "time_analysis": "時間帯分析",
+    "article_join": "記事統合",
+    "link_graph": "内部リンク分析",
+    "cannibalization": "キーワード競合",
+    "query_clusters": "クエリクラスタ"
 }
@@ -6,63 +6,153 @@ Google Analytics + Search Console → Google Sheets
 Usage:
     python dashboard.py          # フルダッシュボード更新
     python dashboard.py --quick  # サマリーのみ更新
+    python dashboard.py --resume # 前回失敗した実行を途中から再開
+    python dashboard.py --profile # 段階ごとの時間・メモリを data/profiles/ に記録
+    python dashboard.py --no-cache      # APIレスポンスのキャッシュを使わない
+    python dashboard.py --refresh-cache # キャッシュを破棄して取り直す
 """
 
 import argparse
 from datetime import datetime
 import config
-from ga4_client import GA4Client
+import response_cache
+from ga4_client import (
+    GA4Client, HOURLY_CUBE, SOURCE_CUBE, PAGE_CUBE,
+    daily_from_cube, hourly_from_cube, dayofweek_from_cube, traffic_from_cube,
+)
 from search_console_client import SearchConsoleClient
-from sheets_client import SheetsClient
+from sheets_client import SheetsClient, CELL_LIMIT, build_summary_rows, build_trend_frame
 from charts import create_charts
+from sync_articles import load_articles
+from article_join import join_articles
+from cannibalization import detect_cannibalization
+from query_clusters import cluster_queries
+from trend_engine import update_trends, trend_columns, recent_anomalies
+from run_checkpoint import RunCheckpoint
+from static_export import build_views, export_dashboard
+from run_profiler import Profiler
 
 
-def build_dashboard(quick_mode=False):
-    """ダッシュボードを構築"""
+def build_dashboard(quick_mode=False, resume=False, profiler=None):
+    """ダッシュボードを構築
+
+    resume=True の場合、前回失敗した実行の取得済みレポート・完了済みの書き込みをスキップする
+    profiler（run_profiler.Profiler）を渡すと処理段階ごとに計測する
+    """
+    profiler = profiler or Profiler('dashboard')
     print(f"[{datetime.now()}] ダッシュボード更新開始...")
     print(f"対象サイト: {config.SEARCH_CONSOLE_SITE_URL}")
     print(f"期間: 過去{config.REPORT_DAYS}日間")
     print("-" * 50)
 
     # クライアント初期化
+    profiler.stage('初期化')
     ga4 = GA4Client()
     gsc = SearchConsoleClient()
     sheets = SheetsClient()
+    run = RunCheckpoint(resume=resume)
+    if run.resumed:
+        sheets.restore_written(run.get('written_sheets'))
 
     # === Google Analytics データ取得 ===
-    print("[GA4] 日別PVデータ取得中...")
-    daily_pv = ga4.get_daily_pv(days=config.REPORT_DAYS)
-    print(f"  → {len(daily_pv)}日分取得完了")
+    profiler.stage('GA4取得')
+    if config.GA4_CUBES:
+        # 日付×時間帯・日付×デバイス×流入元の2つのキューブから日別・時間帯・曜日・流入元をローカルで集計
+        print("[GA4] 時間帯キューブ取得中...")
+        hourly_cube = run.fetch(HOURLY_CUBE, ga4.get_cube, name=HOURLY_CUBE, days=config.REPORT_DAYS)
+        print(f"  → {len(hourly_cube):,}行取得完了")
+        print("[GA4] 流入元キューブ取得中...")
+        source_cube = run.fetch(SOURCE_CUBE, ga4.get_cube, name=SOURCE_CUBE, days=config.REPORT_DAYS)
+        print(f"  → {len(source_cube):,}行取得完了")
+        if config.GA4_PAGE_CUBE:
+            # 記事別の日別PV（ローカルでの問い合わせ用。local_query.py）
+            print("[GA4] 記事別キューブ取得中...")
+            page_cube = run.fetch(PAGE_CUBE, ga4.get_cube, name=PAGE_CUBE, days=config.REPORT_DAYS)
+            print(f"  → {len(page_cube):,}行取得完了")
+
+        daily_pv = daily_from_cube(hourly_cube, source_cube)
+        hourly_stats = hourly_from_cube(hourly_cube)
+        dayofweek_stats = dayofweek_from_cube(hourly_cube, source_cube)
+        traffic = traffic_from_cube(source_cube)
+        print(f"  → {len(daily_pv)}日分・{len(hourly_stats)}時間帯・{len(dayofweek_stats)}曜日・{len(traffic)}ソースを集計"
+              f"（ユーザー数・平均滞在時間は概算）")
+    else:
+        print("[GA4] 日別PVデータ取得中...")
+        daily_pv = run.fetch('daily_pv', ga4.get_daily_pv, days=config.REPORT_DAYS)
+        print(f"  → {len(daily_pv)}日分取得完了")
 
     print("[GA4] 記事別パフォーマンス取得中...")
-    article_perf = ga4.get_article_performance(days=config.REPORT_DAYS)
+    # 全記事分は記事統合シート用。記事別パフォーマンスシート・静的ダッシュボードは上位のみ
+    article_perf = run.fetch('article_perf', ga4.get_article_performance,
+                             days=config.REPORT_DAYS, limit=config.ARTICLE_LIMIT)
+    top_articles = article_perf.head(config.ARTICLE_TOP_LIMIT)
     print(f"  → {len(article_perf)}記事分取得完了")
 
-    print("[GA4] 流入元データ取得中...")
-    traffic = ga4.get_traffic_sources(days=config.REPORT_DAYS)
-    print(f"  → {len(traffic)}ソース取得完了")
+    if not config.GA4_CUBES:
+        print("[GA4] 流入元データ取得中...")
+        traffic = run.fetch('traffic', ga4.get_traffic_sources, days=config.REPORT_DAYS)
+        print(f"  → {len(traffic)}ソース取得完了")
 
-    print("[GA4] 時間帯別データ取得中...")
-    hourly_stats = ga4.get_hourly_stats(days=config.REPORT_DAYS)
-    print(f"  → {len(hourly_stats)}時間帯取得完了")
+        print("[GA4] 時間帯別データ取得中...")
+        hourly_stats = run.fetch('hourly_stats', ga4.get_hourly_stats, days=config.REPORT_DAYS)
+        print(f"  → {len(hourly_stats)}時間帯取得完了")
 
-    print("[GA4] 曜日別データ取得中...")
-    dayofweek_stats = ga4.get_dayofweek_stats(days=config.REPORT_DAYS)
-    print(f"  → {len(dayofweek_stats)}曜日取得完了")
+        print("[GA4] 曜日別データ取得中...")
+        dayofweek_stats = run.fetch('dayofweek_stats', ga4.get_dayofweek_stats, days=config.REPORT_DAYS)
+        print(f"  → {len(dayofweek_stats)}曜日取得完了")
 
     # === Search Console データ取得 ===
+    profiler.stage('GSC取得')
     print("[GSC] 検索クエリデータ取得中...")
-    queries = gsc.get_search_queries(days=config.REPORT_DAYS)
+    queries = run.fetch('queries', gsc.get_search_queries, days=config.REPORT_DAYS)
     print(f"  → {len(queries)}クエリ取得完了")
 
     print("[GSC] 日別検索パフォーマンス取得中...")
-    gsc_daily = gsc.get_daily_performance(days=config.REPORT_DAYS)
+    gsc_daily = run.fetch('gsc_daily', gsc.get_daily_performance, days=config.REPORT_DAYS)
     print(f"  → {len(gsc_daily)}日分取得完了")
 
     print("[GSC] ページ別パフォーマンス取得中...")
-    page_perf = gsc.get_page_performance(days=config.REPORT_DAYS)
+    page_perf = run.fetch('page_perf', gsc.get_page_performance,
+                          days=config.REPORT_DAYS, limit=config.ARTICLE_LIMIT)
     print(f"  → {len(page_perf)}ページ取得完了")
 
+    # === クエリクラスタ・キーワード競合の検出・WordPress記事と結合 ===
+    # 元データは大きいため、集計結果をチェックポイントにする
+    article_join = None
+    cannibalization = None
+    query_clusters = None
+    if not quick_mode:
+        profiler.stage('クエリクラスタ')
+        print("[GSC] 全検索クエリ取得・クラスタ集計中...")
+        query_clusters = run.fetch(
+            'query_clusters',
+            lambda days, limit: cluster_queries(gsc.get_search_queries(days=days, limit=limit)),
+            days=config.REPORT_DAYS, limit=config.QUERY_LIMIT
+        )
+        print(f"  → {len(query_clusters)}クラスタに集約")
+
+        profiler.stage('キーワード競合')
+        print("[GSC] ページ×クエリ別データ取得・キーワード競合検出中...")
+        cannibalization = run.fetch(
+            'cannibalization',
+            lambda days, limit: detect_cannibalization(gsc.get_page_query_performance(days=days, limit=limit)),
+            days=config.REPORT_DAYS, limit=config.PAGE_QUERY_LIMIT
+        )
+        print(f"  → {len(cannibalization)}件の競合を検出")
+
+        profiler.stage('記事統合')
+        print("[WP] 記事一覧（sync_articles.py のスナップショット）読み込み中...")
+        article_join = run.fetch(
+            'article_join',
+            lambda: join_articles(load_articles(), article_perf, page_perf)
+        )
+        print(f"  → {len(article_join)}記事を結合完了")
+
+    # === トレンド集計（新しい日・確定した日だけ差分更新） ===
+    profiler.stage('トレンド集計')
+    trends = update_trends(daily_pv, gsc_daily)
+    anomalies = recent_anomalies(trends)
+
     # === サマリーデータ作成 ===
     summary_data = {
         'total_pv': int(daily_pv['screenPageViews'].sum()) if not daily_pv.empty else 0,
@@ -71,47 +161,103 @@ def build_dashboard(quick_mode=False):
         'avg_session_duration': round(daily_pv['averageSessionDuration'].mean(), 1) if not daily_pv.empty else 0,
         'total_clicks': int(queries['clicks'].sum()) if not queries.empty else 0,
         'total_impressions': int(queries['impressions'].sum()) if not queries.empty else 0,
-        'avg_ctr': round(queries['ctr'].mean(), 2) if not queries.empty else 0,
-        'avg_position': round(queries['position'].mean(), 1) if not queries.empty else 0,
-        'top_articles': []
+        'avg_ctr': round(float(queries['ctr'].mean()), 2) if not queries.empty else 0,
+        'avg_position': round(float(queries['position'].mean()), 1) if not queries.empty else 0,
+        'top_articles': [],
+        'anomalies': anomalies
     }
 
     # トップ記事リスト
-    if not article_perf.empty:
-        for _, row in article_perf.head(10).iterrows():
-            summary_data['top_articles'].append({
-                'title': row['pageTitle'][:50],
-                'pv': int(row['screenPageViews'])
-            })
+    if not top_articles.empty:
+        top = top_articles.head(10)
+        summary_data['top_articles'] = [
+            {'title': title[:50], 'pv': pv}
+            for title, pv in zip(top['pageTitle'].tolist(), top['screenPageViews'].astype(int).tolist())
+        ]
 
     # === スプレッドシートに書き込み ===
+    def write_step(name, func, *args):
+        """書き込みを実行し、完了と書き込んだシートを記録"""
+        result = run.write(name, func, *args)
+        run.set('written_sheets', sheets.written_sheets())
+        return result
+
+    profiler.stage('シート書き込み')
     print("-" * 50)
     print("[Sheets] サマリー更新中...")
-    sheets.write_summary(summary_data)
+    write_step('summary', sheets.write_summary, summary_data)
 
+    charts_failed = False
     if not quick_mode:
         print("[Sheets] 日別PVシート更新中...")
-        sheets.write_daily_pv(daily_pv)
+        write_step('daily_pv', sheets.write_daily_pv, daily_pv)
 
         print("[Sheets] 記事別パフォーマンスシート更新中...")
-        sheets.write_article_performance(article_perf)
+        write_step('article_performance', sheets.write_article_performance, top_articles)
 
         print("[Sheets] 検索クエリシート更新中...")
-        sheets.write_search_queries(queries)
+        write_step('search_queries', sheets.write_search_queries, queries)
+
+        print("[Sheets] 記事統合シート更新中...")
+        write_step('article_join', sheets.write_article_join, article_join)
+
+        print("[Sheets] キーワード競合シート更新中...")
+        write_step('cannibalization', sheets.write_cannibalization, cannibalization)
+
+        print("[Sheets] クエリクラスタシート更新中...")
+        write_step('query_clusters', sheets.write_query_clusters, query_clusters)
 
         print("[Sheets] トレンド分析シート更新中...")
-        sheets.write_trends(daily_pv, gsc_daily)
+        write_step('trends', sheets.write_trends, daily_pv, gsc_daily, trend_columns(trends))
 
         print("[Sheets] 時間帯分析シート更新中...")
-        sheets.write_time_analysis(hourly_stats, dayofweek_stats)
+        write_step('time_analysis', sheets.write_time_analysis, hourly_stats, dayofweek_stats)
+
+        profiler.stage('書式・グラフ')
+        print("[Sheets] 書式チェック中...")
+        if write_step('formats', sheets.apply_formats):
+            print("  → 書式を更新しました")
+        else:
+            print("  → 変更なし（スキップ）")
 
         print("[Sheets] グラフ作成中...")
         try:
-            create_charts(config.SPREADSHEET_ID)
+            write_step('charts', create_charts, config.SPREADSHEET_ID, sheets.index)
         except Exception as e:
             print(f"  ⚠️ グラフ作成スキップ: {e}")
+            charts_failed = True
+
+        print("[Sheets] セル数チェック中...")
+        budget = sheets.get_cell_budget()
+        total_cells = int(budget['cells'].sum()) if not budget.empty else 0
+        print(f"  → {total_cells:,} / {CELL_LIMIT:,}セル使用 ({total_cells / CELL_LIMIT * 100:.1f}%)")
+        for row in budget.head(3).to_dict('records'):
+            print(f"     {row['sheet']}: {row['rows']:,}行 × {row['cols']}列 = {row['cells']:,}セル")
+
+    # === 静的ダッシュボードの書き出し（閲覧時にAPIを使わない） ===
+    profiler.stage('静的エクスポート')
+    print("[Export] 静的ダッシュボード書き出し中...")
+    views = build_views(
+        build_summary_rows(summary_data),
+        build_trend_frame(daily_pv, gsc_daily, trend_columns(trends)),
+        top_articles, queries, hourly_stats, dayofweek_stats,
+        extra_tables={
+            'query_clusters': (config.SHEETS['query_clusters'], query_clusters),
+            'cannibalization': (config.SHEETS['cannibalization'], cannibalization),
+            'article_join': (config.SHEETS['article_join'], article_join),
+        }
+    )
+    manifest = export_dashboard(views)
+    gzip_bytes = sum(v['gzip_bytes'] for v in manifest['views'].values())
+    print(f"  → {len(views)}ビュー（gzip {gzip_bytes / 1024:,.0f}KB）を {config.EXPORT_DIR}/ に書き出し")
 
     print("-" * 50)
+    if charts_failed:
+        print("  → グラフ作成のみ未完了です（--resume でグラフ作成だけ再実行できます）")
+    else:
+        run.complete()
+    cache_stats = response_cache.stats()
+    print(f"[Cache] APIレスポンス: キャッシュ利用 {cache_stats['hit']}件 / 取得 {cache_stats['miss']}件")
     print(f"[{datetime.now()}] ダッシュボード更新完了!")
     print(f"スプレッドシート: https://docs.google.com/spreadsheets/d/{config.SPREADSHEET_ID}")
 
@@ -128,15 +274,30 @@ def build_dashboard(quick_mode=False):
     print(f"検索表示回数:     {summary_data['total_impressions']:,}")
     print(f"平均CTR:          {summary_data['avg_ctr']}%")
     print(f"平均検索順位:     {summary_data['avg_position']}位")
+    if anomalies:
+        print("-" * 50)
+        for a in anomalies[:5]:
+            print(f"⚠️ 異常値: {a['date']} {a['metric']} {a['value']:,} (z={a['z']})")
     print("=" * 50)
 
 
 def main():
     parser = argparse.ArgumentParser(description='machiyomi-fudosan.com Analytics Dashboard')
     parser.add_argument('--quick', action='store_true', help='サマリーのみ更新')
+    parser.add_argument('--resume', action='store_true', help='前回失敗した実行の取得済みデータ・完了済みの書き込みを再利用')
+    parser.add_argument('--profile', action='store_true', help='段階ごとの時間・メモリ・CPUサンプルを記録')
+    parser.add_argument('--no-cache', action='store_true', help='APIレスポンスのキャッシュを使わない')
+    parser.add_argument('--refresh-cache', action='store_true', help='保存済みのAPIレスポンスを破棄して取り直す')
     args = parser.parse_args()
 
-    build_dashboard(quick_mode=args.quick)
+    response_cache.configure(bypass=args.no_cache, refresh=args.refresh_cache)
+
+    profiler = Profiler('dashboard', enabled=args.profile)
+    try:
+        build_dashboard(quick_mode=args.quick, resume=args.resume, profiler=profiler)
+    finally:
+        # 途中で失敗した場合もそこまでの計測結果を保存する
+        profiler.finish()
 
 
 if __name__ == '__main__':
@@ -5,6 +5,7 @@ GA4からデータを取得
 
 from google.analytics.data_v1beta.types import (
     RunReportRequest,
+    RunReportResponse,
     DateRange,
     Dimension,
     Metric,
@@ -13,33 +14,80 @@ from google.analytics.data_v1beta.types import (
 from datetime import datetime, timedelta
 import pandas as pd
 import config
+import local_store
+import response_cache
 from auth import get_ga4_client
 
+# 多次元キューブ（config.GA4_CUBES）: 日付を含むレポートを1回取得して日付パーティションで保存し、
+# 日別・時間帯別・曜日別・流入元・デバイスの集計はローカルで行う
+HOURLY_CUBE = 'ga4_hourly_cube'
+SOURCE_CUBE = 'ga4_source_cube'
+PAGE_CUBE = 'ga4_page_cube'  # 記事別の日別PV（local_query.py で問い合わせ）
+CUBES = {
+    HOURLY_CUBE: (['hour'], ['screenPageViews', 'sessions', 'activeUsers', 'averageSessionDuration']),
+    SOURCE_CUBE: (['deviceCategory', 'sessionSource', 'sessionMedium'], ['screenPageViews', 'sessions', 'activeUsers']),
+    PAGE_CUBE: (['pagePath'], ['screenPageViews', 'sessions']),
+}
+CUBE_PAGE_ROWS = 100000
+
+# 足し合わせるとAPIの値と一致しない指標（集計結果の df.attrs['non_additive'] に説明を付ける）
+NON_ADDITIVE = {
+    'activeUsers': '日・時間帯などの区分ごとのユーザー数の合計（同じユーザーを重複して数える）',
+    'averageSessionDuration': 'セッション数による加重平均（概算）',
+}
+# 時間帯別のセッション数（hour はイベント単位のため、複数の時間帯にまたがるセッションは各時間帯で数える）
+HOURLY_SESSIONS = '時間帯ごとのセッション数（複数の時間帯にまたがるセッションを重複して数えるため、合計は総セッション数より多い）'
+
 
 class GA4Client:
     def __init__(self):
         self.client = get_ga4_client()
         self.property_id = f"properties/{config.GA4_PROPERTY_ID}"
 
+    def _report_request(self, dimensions, metrics, start_date, end_date, limit, offset=0):
+        return RunReportRequest(
+            property=self.property_id,
+            date_ranges=[DateRange(start_date=start_date, end_date=end_date)],
+            dimensions=[Dimension(name=d) for d in dimensions],
+            metrics=[Metric(name=m) for m in metrics],
+            limit=limit,
+            offset=offset
+        )
+
+    def _execute(self, request):
+        """レポートを実行（レスポンスキャッシュ経由）"""
+        return response_cache.cached(
+            'ga4', RunReportRequest.to_dict(request),
+            lambda: self.client.run_report(request),
+            dumps=RunReportResponse.serialize, loads=RunReportResponse.deserialize
+        )
+
     def _run_report(self, dimensions, metrics, date_range_days=30, limit=100):
         """汎用レポート実行"""
         end_date = datetime.now()
         start_date = end_date - timedelta(days=date_range_days)
 
-        request = RunReportRequest(
-            property=self.property_id,
-            date_ranges=[DateRange(
-                start_date=start_date.strftime("%Y-%m-%d"),
-                end_date=end_date.strftime("%Y-%m-%d")
-            )],
-            dimensions=[Dimension(name=d) for d in dimensions],
-            metrics=[Metric(name=m) for m in metrics],
-            limit=limit
+        request = self._report_request(
+            dimensions, metrics,
+            start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"),
+            limit
         )
-
-        response = self.client.run_report(request)
+        response = self._execute(request)
         return self._response_to_dataframe(response, dimensions, metrics)
 
+    def _run_report_all(self, dimensions, metrics, start_date, end_date):
+        """期間内の全行を取得（CUBE_PAGE_ROWS 行ずつページング）"""
+        frames = []
+        offset = 0
+        while True:
+            request = self._report_request(dimensions, metrics, start_date, end_date, CUBE_PAGE_ROWS, offset)
+            response = self._execute(request)
+            frames.append(self._response_to_dataframe(response, dimensions, metrics))
+            offset += len(response.rows)
+            if not response.rows or offset >= response.row_count:
+                break
+        return pd.concat(frames, ignore_index=True)
+
     def _response_to_dataframe(self, response, dimensions, metrics):
         """APIレスポンスをDataFrameに変換"""
         rows = []
@@ -156,3 +204,126 @@ class GA4Client:
             # 曜日順にソート（0=日曜, 1=月曜, ...）
             df = df.sort_values('dayOfWeek')
         return df
+
+    def get_cube(self, name, days=30):
+        """キューブ（日付 × CUBES[name] のディメンション）を取得
+
+        未取得・速報値の日だけをAPIから取得してローカルに保存し、期間内の全日をローカルから返す。
+        直近 GA4_FINAL_LAG_DAYS 日は速報値として保存し、次回以降に取り直す
+        """
+        dimensions, metrics = CUBES[name]
+        today = datetime.now().date()
+        start_date = today - timedelta(days=days)
+        keys = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days + 1)]
+
+        pending = local_store.pending_partitions(name, keys)
+        if pending:
+            self._fetch_cube_partitions(name, pending, today)
+
+        df = local_store.read_table(name, keys[0], keys[-1])
+        if df.empty:
+            return _empty_cube(name)
+        return df.drop(columns='provisional').sort_values(['date'] + dimensions).reset_index(drop=True)
+
+    def _fetch_cube_partitions(self, name, keys, today):
+        """指定日のキューブを1回のレポート（ページング）で取得して日付ごとに保存"""
+        dimensions, metrics = CUBES[name]
+        df = self._run_report_all(['date'] + dimensions, metrics, keys[0], keys[-1])
+        if df.empty:
+            df = pd.DataFrame(columns=['date'] + dimensions + metrics)
+
+        if 'hour' in df.columns:
+            df['hour'] = df['hour'].astype('int8')
+        for metric in metrics:
+            df[metric] = df[metric].astype(float if metric == 'averageSessionDuration' else 'int64')
+        df['date'] = pd.to_datetime(df['date'], format='%Y%m%d').dt.strftime('%Y-%m-%d')
+
+        lag_start = (today - timedelta(days=config.GA4_FINAL_LAG_DAYS)).strftime('%Y-%m-%d')
+        groups = dict(tuple(df.groupby('date', sort=False)))
+        empty = df.iloc[:0].drop(columns='date')
+        partitions = [
+            (key, groups[key].drop(columns='date').reset_index(drop=True) if key in groups else empty,
+             key > lag_start)
+            for key in keys
+        ]
+        local_store.write_partitions(name, partitions)
+
+
+def _empty_cube(name):
+    """行のないキューブ（保存済みの行と同じ型。date列は datetime64）"""
+    dimensions, metrics = CUBES[name]
+    columns = {'date': pd.Series(dtype='datetime64[ns]')}
+    for dim in dimensions:
+        columns[dim] = pd.Series(dtype='int8' if dim == 'hour' else object)
+    for metric in metrics:
+        columns[metric] = pd.Series(dtype=float if metric == 'averageSessionDuration' else 'int64')
+    return pd.DataFrame(columns)
+
+
+def _label_non_additive(df):
+    """足し合わせた非加算指標の説明を df.attrs に付ける"""
+    df.attrs['non_additive'] = {m: NON_ADDITIVE[m] for m in NON_ADDITIVE if m in df.columns}
+    return df
+
+
+def _rollup(cube, keys, metrics):
+    """キューブを keys ごとに集計（平均滞在時間はセッション数で加重平均）"""
+    cube = cube.assign(**(
+        {'_duration': cube['averageSessionDuration'] * cube['sessions']}
+        if 'averageSessionDuration' in metrics else {}
+    ))
+    sums = [m for m in metrics if m != 'averageSessionDuration'] + (
+        ['_duration'] if 'averageSessionDuration' in metrics else []
+    )
+    df = cube.groupby(keys, sort=True, observed=True)[sums].sum().reset_index()
+    if 'averageSessionDuration' in metrics:
+        df['averageSessionDuration'] = (df['_duration'] / df['sessions'].where(df['sessions'] > 0)).fillna(0).round(1)
+        df = df.drop(columns='_duration')
+    return _label_non_additive(df[keys + metrics])
+
+
+def _session_counts(df, source_cube, keys):
+    """セッション数を流入元キューブの集計で置き換える
+
+    hour はイベント単位のディメンションのため、時間帯キューブでは複数の時間帯にまたがるセッションを
+    時間帯ごとに数える。流入元キューブのディメンション（デバイス・参照元・メディア）はセッション単位なので、
+    合計が日別レポートのセッション数と一致する
+    """
+    sessions = source_cube.groupby(keys, sort=False, observed=True)['sessions'].sum()
+    df['sessions'] = df.set_index(keys).index.map(sessions).fillna(0).astype('int64')
+    return df
+
+
+def daily_from_cube(hourly_cube, source_cube):
+    """時間帯キューブ・流入元キューブ → get_daily_pv と同じ形式（セッション数は流入元キューブから）"""
+    df = _rollup(hourly_cube, ['date'],
+                 ['screenPageViews', 'sessions', 'activeUsers', 'averageSessionDuration'])
+    return _session_counts(df, source_cube, ['date'])
+
+
+def hourly_from_cube(hourly_cube):
+    """時間帯キューブ → get_hourly_stats と同じ形式（セッション数は時間帯ごとの値のため非加算として説明を付ける）"""
+    df = _rollup(hourly_cube, ['hour'], ['screenPageViews', 'sessions', 'activeUsers'])
+    df['hour'] = df['hour'].astype(int)
+    df.attrs['non_additive']['sessions'] = HOURLY_SESSIONS
+    return df
+
+
+def dayofweek_from_cube(hourly_cube, source_cube):
+    """時間帯キューブ・流入元キューブ → get_dayofweek_stats と同じ形式（0=日曜、セッション数は流入元キューブから）"""
+    def with_weekday(cube):
+        return cube.assign(dayOfWeek=(cube['date'].dt.dayofweek + 1) % 7)
+
+    df = _rollup(with_weekday(hourly_cube), ['dayOfWeek'], ['screenPageViews', 'sessions', 'activeUsers'])
+    return _session_counts(df, with_weekday(source_cube), ['dayOfWeek'])
+
+
+def traffic_from_cube(source_cube, limit=20):
+    """流入元キューブ → get_traffic_sources と同じ形式"""
+    df = _rollup(source_cube, ['sessionSource', 'sessionMedium'], ['sessions', 'activeUsers'])
+    return df.sort_values('sessions', ascending=False, kind='stable').head(limit)
+
+
+def device_from_cube(source_cube):
+    """流入元キューブ → get_device_category と同じ形式"""
+    return _rollup(source_cube, ['deviceCategory'], ['sessions', 'screenPageViews'])
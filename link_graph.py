@@ -0,0 +1,107 @@
+"""
+Internal Link Graph
+記事本文の内部リンクからリンクグラフを作り、被リンク数・孤立記事・内部評価スコアを計算
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from article_join import build_path_index, normalize_paths
+
+INTERNAL_HREF = re.compile(r'href="(https://machiyomi-fudosan\.com[^"]*)"')
+
+
+def extract_edges(posts, articles):
+    """内部リンクを (リンク元, リンク先) の記事番号の配列にする
+
+    記事番号は articles の並び順。自己リンク・記事以外へのリンク・重複リンクは除く
+    """
+    position = {art['ID']: i for i, art in enumerate(articles)}
+    src = []
+    targets = []
+    for post in posts:
+        i = position[str(post['id'])]
+        hrefs = INTERNAL_HREF.findall(post.get('content', {}).get('rendered', ''))
+        src.extend([i] * len(hrefs))
+        targets.extend(hrefs)
+
+    n = len(articles)
+    src = np.asarray(src, dtype=np.int64)
+    if not len(src):
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+    # 同じURLへのリンクは多いので、ユニークなURLだけ正規化して記事番号に変換
+    codes, urls = pd.factorize(pd.Series(targets))
+    target_pos = normalize_paths(urls).map(build_path_index(articles)).map(position)
+    dst = target_pos.to_numpy(dtype=np.float64)[codes]
+    valid = ~np.isnan(dst)
+    src = src[valid]
+    dst = dst[valid].astype(np.int64)
+
+    # 同じリンク元→リンク先は1本にまとめる
+    edges = np.unique(src * n + dst)
+    src, dst = edges // n, edges % n
+    keep = src != dst
+    return src[keep].astype(np.int32), dst[keep].astype(np.int32)
+
+
+def internal_pagerank(src, dst, n, damping=0.85, tol=1e-9, max_iter=100):
+    """PageRank型の内部評価スコア
+
+    辺リスト（疎な隣接行列）との行列ベクトル積を bincount で計算して反復する
+    """
+    if n == 0:
+        return np.empty(0)
+
+    out_degree = np.bincount(src, minlength=n)
+    weights = 1.0 / out_degree[src]
+    dangling = out_degree == 0
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        spread = np.bincount(dst, weights=rank[src] * weights, minlength=n)
+        new_rank = (1 - damping) / n + damping * (spread + rank[dangling].sum() / n)
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < tol:
+            break
+    return rank
+
+
+def analyze_links(posts, articles, suggestions=3):
+    """記事ごとの被リンク数・発リンク数・孤立判定・内部評価スコアを計算
+
+    被リンクの少ない記事には、同じカテゴリで評価スコアの高い記事をリンク元候補として挙げる
+    """
+    columns = ['ID', 'タイトル', 'カテゴリ', '被リンク数', '発リンク数', '内部評価スコア', '孤立', 'リンク元候補']
+    n = len(articles)
+    if n == 0:
+        return pd.DataFrame(columns=columns)
+
+    src, dst = extract_edges(posts, articles)
+    rank = internal_pagerank(src, dst, n)
+
+    df = pd.DataFrame({
+        'ID': [art['ID'] for art in articles],
+        'タイトル': [art['タイトル'] for art in articles],
+        'カテゴリ': [art['カテゴリ'].split(', ')[0] for art in articles],
+        '被リンク数': np.bincount(dst, minlength=n),
+        '発リンク数': np.bincount(src, minlength=n),
+        # 平均的な記事が 1.0 になるように記事数を掛ける
+        '内部評価スコア': (rank * n).round(3),
+    })
+    df['孤立'] = np.where(df['被リンク数'] == 0, '孤立', '')
+
+    # カテゴリごとの評価上位記事をリンク元候補にする
+    top = df.sort_values('内部評価スコア', ascending=False).groupby('カテゴリ').head(suggestions + 1)
+    candidates = top.groupby('カテゴリ')['ID'].agg(list).to_dict()
+    titles = dict(zip(df['ID'], df['タイトル']))
+
+    needs_links = df['被リンク数'] <= 1
+    df['リンク元候補'] = ''
+    df.loc[needs_links, 'リンク元候補'] = [
+        ' / '.join(titles[i][:30] for i in [c for c in candidates[cat] if c != article_id][:suggestions])
+        for article_id, cat in zip(df.loc[needs_links, 'ID'], df.loc[needs_links, 'カテゴリ'])
+    ]
+
+    return df[columns].sort_values('内部評価スコア', ascending=False).reset_index(drop=True)
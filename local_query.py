@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Local Query
+ローカルに保存したGA4・GSC・WordPressのデータへの問い合わせ（APIは使わない）
+
+Usage:
+    python local_query.py tables                                      # 問い合わせできるテーブル一覧
+    python local_query.py query gsc_daily --start 2026-07-01 --agg clicks:sum --agg position:mean
+    python local_query.py query ga4_page_cube --start 2026-07-01 --end 2026-09-30 --join articles \\
+        --where "カテゴリ contains 売却" --group-by pagePath --group-by タイトル \\
+        --agg screenPageViews:sum --order -screenPageViews_sum --limit 20
+    python local_query.py change rank_query --key query --metric position \\
+        --before 2026-06-01:2026-06-30 --after 2026-09-01:2026-09-30 --where "delta <= -5"
+
+列指向のエンジン（pyarrow.dataset）で読み込む。日付パーティションは期間外のファイルを開かず（マニフェストで絞り込み）、
+条件は読み込み時に適用する（Parquetの行グループ統計で読み飛ばし）
+"""
+
+import argparse
+import os
+import re
+from datetime import date
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import config
+import local_store
+from rank_archive import RankArchive
+from sync_articles import ARTICLES_TABLE
+
+# 検索順位アーカイブ（rank_archive.py）。articles は sync_articles.save_articles のスナップショット
+RANK_TABLES = {'rank_query': 'query', 'rank_page': 'page'}
+
+COMPARE_FUNCS = {
+    '==': pc.equal, '!=': pc.not_equal,
+    '>': pc.greater, '>=': pc.greater_equal,
+    '<': pc.less, '<=': pc.less_equal,
+}
+AGG_FUNCS = ['sum', 'mean', 'min', 'max', 'count', 'count_distinct']
+_FILTER = re.compile(r'^\s*(.+?)\s*(>=|<=|==|!=|=|>|<|\s+contains\s+|\s+in\s+)\s*(.+?)\s*$')
+
+
+def tables():
+    """問い合わせできるテーブル名 → 説明"""
+    result = {}
+    if os.path.isdir(config.DATA_DIR):
+        for name in sorted(os.listdir(config.DATA_DIR)):
+            manifest = local_store.load_manifest(name)
+            if manifest:
+                days = sorted(manifest)
+                rows = sum(p['rows'] for p in manifest.values())
+                result[name] = f'日付パーティション {days[0]}〜{days[-1]}（{len(days)}日・{rows:,}行）'
+    for name, kind in RANK_TABLES.items():
+        days = RankArchive(kind).archived_days()
+        if days:
+            result[name] = f'検索順位アーカイブ {min(days)}〜{max(days)}（{len(days)}日）'
+    if os.path.exists(os.path.join(config.DATA_DIR, f'{ARTICLES_TABLE}.parquet')):
+        result[ARTICLES_TABLE] = 'WordPress記事（最後に取得した時点）'
+    return result
+
+
+def parse_filter(text):
+    """'clicks > 10' / 'カテゴリ contains 売却' / 'query in 売却,査定' → (列, 演算子, 値)"""
+    match = _FILTER.match(text)
+    if not match:
+        raise ValueError(f'条件を解釈できません: {text}')
+    column, op, value = match.groups()
+    op = op.strip()
+    if op == '=':
+        op = '=='
+    if op == 'in':
+        return column, op, [_parse_value(v.strip()) for v in value.split(',')]
+    return column, op, _parse_value(value)
+
+
+def _parse_value(value):
+    value = value.strip('"\'')
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _date_value(value):
+    """'YYYY-MM-DD' の条件値を date に変換（date32 の列との比較用）"""
+    if isinstance(value, list):
+        return [_date_value(v) for v in value]
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f'日付を解釈できません: {value}（YYYY-MM-DD）') from None
+
+
+def _date_bounds(filters, start, end):
+    """date 列の条件から読み込む期間を絞る（パーティション・月の読み飛ばし用。条件は読み込み後にも適用）"""
+    for column, op, value in filters:
+        if column != 'date' or op not in ('>=', '>', '<=', '<', '=='):
+            continue
+        day = _date_value(value).isoformat()
+        if op in ('>=', '>', '=='):
+            start = max(start, day) if start else day
+        if op in ('<=', '<', '=='):
+            end = min(end, day) if end else day
+    return start, end
+
+
+def _compare(values, op, value):
+    """配列または式（pc.field）に条件を適用"""
+    if op == 'in':
+        return pc.is_in(values, value_set=pa.array(value))
+    if op == 'contains':
+        return pc.match_substring(values, str(value))
+    if op not in COMPARE_FUNCS:
+        raise ValueError(f'未対応の演算子です: {op}')
+    return COMPARE_FUNCS[op](values, value)
+
+
+def _filter_table(table, filters):
+    """取得済みの表に条件を適用（辞書型の列は辞書の値だけ判定してインデックスで展開）"""
+    for column, op, value in filters:
+        col = table.column(column)
+        if pa.types.is_date(col.type) and op != 'contains':
+            value = _date_value(value)
+        if pa.types.is_dictionary(col.type):
+            masks = [
+                pc.take(pc.fill_null(_compare(chunk.dictionary, op, value), False), chunk.indices)
+                for chunk in col.chunks
+            ]
+            mask = pa.chunked_array(masks, type=pa.bool_())
+        else:
+            mask = pc.fill_null(_compare(col, op, value), False)
+        table = table.filter(mask)
+    return table
+
+
+def _partitioned_scan(name, start, end, filters):
+    """日付パーティションのテーブルを読み込み（期間外のパーティションは開かない）
+
+    (Table, 読み込み時に適用した条件) を返す
+    """
+    manifest = local_store.load_manifest(name)
+    stored = [k for k in sorted(manifest) if manifest[k]['rows']]
+    keys = [k for k in stored if not (start and k < start) and not (end and k > end)]
+
+    base_dir = os.path.join(config.DATA_DIR, name)
+    dataset = ds.dataset(
+        # 期間内にデータがない場合も列構成は返すため、1パーティションだけ開く
+        [os.path.join(base_dir, f'date={k}', 'part-0.parquet') for k in (keys or stored[-1:])],
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive'),
+        partition_base_dir=base_dir,
+    )
+    pushed = [f for f in filters if f[0] in dataset.schema.names and f[0] != 'date']
+    expression = None
+    for column, op, value in pushed:
+        condition = _compare(pc.field(column), op, value)
+        expression = condition if expression is None else expression & condition
+    table = dataset.to_table(filter=expression) if keys else dataset.schema.empty_table()
+    table = table.set_column(
+        table.schema.get_field_index('date'), 'date', pc.cast(table.column('date'), pa.date32())
+    )
+    return table, pushed
+
+
+def scan(name, start=None, end=None, filters=None):
+    """テーブルを pyarrow.Table で読み込み、自分の列に対する条件を適用
+
+    (Table, 適用済みの条件) を返す（結合先の列に対する条件は呼び出し側で適用）
+    """
+    filters = filters or []
+    start, end = _date_bounds(filters, start, end)
+    if name in RANK_TABLES:
+        table = RankArchive(RANK_TABLES[name]).to_arrow(start, end)
+        applied = [f for f in filters if f[0] in table.schema.names]
+        return _filter_table(table, applied), applied
+    if name == ARTICLES_TABLE:
+        df = local_store.read_frame(ARTICLES_TABLE)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        applied = [f for f in filters if f[0] in table.schema.names]
+        return _filter_table(table, applied), applied
+    if not any(p['rows'] for p in local_store.load_manifest(name).values()):
+        raise ValueError(f'テーブルがありません: {name}（python local_query.py tables で一覧を表示）')
+
+    table, pushed = _partitioned_scan(name, start, end, filters)
+    rest = [f for f in filters if f not in pushed and f[0] in table.schema.names]
+    return _filter_table(table, rest), pushed + rest
+
+
+def _decode(table, column):
+    """辞書型の列を文字列に戻す（結合キー用）"""
+    col = table.column(column)
+    if pa.types.is_dictionary(col.type):
+        table = table.set_column(table.schema.get_field_index(column), column, col.cast(col.type.value_type))
+    return table
+
+
+def query(name, start=None, end=None, where=None, join=None, group_by=None, agg=None,
+          order_by=None, limit=None):
+    """ローカルのテーブルに問い合わせて DataFrame を返す
+
+    where: 条件のリスト（'clicks > 10' の文字列または (列, 演算子, 値)）
+    join: 結合するテーブル名、または (テーブル名, キー列)。キーの既定は pagePath
+    group_by: 集計キーの列のリスト（agg なしの場合は件数）
+    agg: {列: 関数} または '列:関数' のリスト。関数は sum / mean / min / max / count / count_distinct
+         結果の列名は <列>_<関数>
+    order_by: 列名のリスト（先頭に - で降順）
+    """
+    filters = [parse_filter(f) if isinstance(f, str) else tuple(f) for f in (where or [])]
+    table, applied = scan(name, start, end, filters)
+
+    if join:
+        join_name, key = (join, 'pagePath') if isinstance(join, str) else join
+        right, right_applied = scan(join_name, filters=[f for f in filters if f not in applied])
+        applied += right_applied
+        table = _decode(table, key).join(_decode(right, key), key, join_type='inner')
+
+    remaining = [f for f in filters if f not in applied]
+    unknown = [f[0] for f in remaining if f[0] not in table.schema.names]
+    if unknown:
+        raise ValueError(f'列がありません: {", ".join(unknown)}')
+    table = _filter_table(table, remaining)
+
+    if isinstance(agg, dict):
+        agg = [f'{col}:{func}' for col, func in agg.items()]
+    aggregations = []
+    for spec in agg or []:
+        column, _, func = spec.partition(':')
+        if func not in AGG_FUNCS:
+            raise ValueError(f'未対応の集計関数です: {func}（{", ".join(AGG_FUNCS)}）')
+        aggregations.append((column, func))
+    if group_by or aggregations:
+        if not aggregations:
+            aggregations = [([], 'count_all')]
+        table = table.group_by(group_by or []).aggregate(aggregations)
+        if 'count_all' in table.schema.names:
+            table = table.rename_columns(['件数' if n == 'count_all' else n for n in table.schema.names])
+
+    if order_by:
+        table = table.sort_by([(o.lstrip('-'), 'descending' if o.startswith('-') else 'ascending')
+                               for o in order_by])
+    if limit:
+        table = table.slice(0, limit)
+    return table.to_pandas()
+
+
+def period_change(name, key, metric, before, after, func='mean', where=None, having=None):
+    """2つの期間の key ごとの metric を比較（delta = 後 − 前、delta の小さい順）
+
+    before / after: (開始日, 終了日)。両方の期間にあるキーだけを返す
+    where: 各期間の集計前に適用する条件 / having: 比較結果に適用する条件（'delta <= -5' など）
+    """
+    frames = []
+    for label, (start, end) in [('before', before), ('after', after)]:
+        df = query(name, start, end, where=where, group_by=[key], agg=[f'{metric}:{func}'])
+        frames.append(df.rename(columns={f'{metric}_{func}': label}))
+    df = frames[0].merge(frames[1], on=key, how='inner')
+    df['delta'] = df['after'] - df['before']
+    if having:
+        filters = [parse_filter(f) if isinstance(f, str) else tuple(f) for f in having]
+        df = _filter_table(pa.Table.from_pandas(df, preserve_index=False), filters).to_pandas()
+    return df.sort_values('delta', kind='stable').reset_index(drop=True)
+
+
+def _date_range(text):
+    start, _, end = text.partition(':')
+    return start or None, end or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ローカルに保存したデータへの問い合わせ（APIは使わない）')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('tables', help='問い合わせできるテーブル一覧')
+
+    q = sub.add_parser('query', help='条件・集計を指定して問い合わせ')
+    q.add_argument('table')
+    q.add_argument('--start', default=None, help='開始日（YYYY-MM-DD）')
+    q.add_argument('--end', default=None, help='終了日（YYYY-MM-DD）')
+    q.add_argument('--where', action='append', default=[], help='条件（例: "clicks > 10"、"カテゴリ contains 売却"）')
+    q.add_argument('--join', default=None, help='結合するテーブル（テーブル名[:キー列]、既定のキーは pagePath）')
+    q.add_argument('--group-by', action='append', default=[], help='集計キーの列')
+    q.add_argument('--agg', action='append', default=[], help='列:関数（sum / mean / min / max / count / count_distinct）')
+    q.add_argument('--order', action='append', default=[], help='並び替える列（-列名 で降順）')
+    q.add_argument('--limit', type=int, default=None, help='表示する行数')
+
+    c = sub.add_parser('change', help='2つの期間の変化を比較')
+    c.add_argument('table')
+    c.add_argument('--key', required=True, help='比較する単位の列（query / page など）')
+    c.add_argument('--metric', required=True, help='比較する指標の列')
+    c.add_argument('--func', default='mean', choices=AGG_FUNCS, help='期間内の集計関数')
+    c.add_argument('--before', required=True, help='前の期間（開始日:終了日）')
+    c.add_argument('--after', required=True, help='後の期間（開始日:終了日）')
+    c.add_argument('--where', action='append', default=[], help='比較結果の条件（例: "delta <= -5"）')
+    c.add_argument('--limit', type=int, default=50, help='表示する行数')
+    args = parser.parse_args()
+
+    if args.command == 'tables':
+        for name, description in tables().items():
+            print(f'{name:<24}{description}')
+        return
+
+    if args.command == 'query':
+        join = args.join
+        if join and ':' in join:
+            join = tuple(join.split(':', 1))
+        df = query(args.table, args.start, args.end, where=args.where, join=join,
+                   group_by=args.group_by, agg=args.agg, order_by=args.order, limit=args.limit)
+    else:
+        df = period_change(args.table, args.key, args.metric, _date_range(args.before), _date_range(args.after),
+                           func=args.func, having=args.where).head(args.limit)
+
+    if df.empty:
+        print("データがありません")
+    else:
+        print(df.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Local Data Store
+取得したデータを日付パーティション単位でローカルに保存
+"""
+
+import json
+import os
+from datetime import datetime
+import pandas as pd
+import config
+
+MANIFEST_FILE = '_manifest.json'
+
+
+def _table_dir(table):
+    return os.path.join(config.DATA_DIR, table)
+
+
+def _partition_path(table, key):
+    return os.path.join(_table_dir(table), f'date={key}', 'part-0.parquet')
+
+
+def load_manifest(table):
+    """テーブルのパーティション一覧を取得 {日付: {provisional, rows, fetched_at}}"""
+    path = os.path.join(_table_dir(table), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(table, manifest):
+    """マニフェストを書き込み（途中で落ちても壊れないよう置き換えで保存）"""
+    path = os.path.join(_table_dir(table), MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def write_partitions(table, partitions):
+    """複数パーティションを書き込み（既存のものは置き換え）
+
+    partitions: [(日付文字列, DataFrame, 速報値かどうか), ...]
+    DataFrameには日付列を含めない（パーティションキーとして保持）
+    """
+    manifest = load_manifest(table)
+    for key, df, provisional in partitions:
+        path = _partition_path(table, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path, index=False)
+        manifest[key] = {
+            'provisional': bool(provisional),
+            'rows': len(df),
+            'fetched_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    _save_manifest(table, manifest)
+
+
+def pending_partitions(table, keys):
+    """未取得または速報値のパーティションを抽出"""
+    manifest = load_manifest(table)
+    return [k for k in keys if k not in manifest or manifest[k]['provisional']]
+
+
+def read_table(table, start_key=None, end_key=None):
+    """パーティションを読み込んで結合（date列・provisional列を付与）"""
+    manifest = load_manifest(table)
+    frames = []
+    for key in sorted(manifest):
+        if start_key and key < start_key:
+            continue
+        if end_key and key > end_key:
+            continue
+        if manifest[key]['rows'] == 0:
+            continue
+        df = pd.read_parquet(_partition_path(table, key))
+        df.insert(0, 'date', pd.Timestamp(key))
+        df['provisional'] = manifest[key]['provisional']
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_json(name):
+    """小さな状態ファイル（JSON）を読み込み"""
+    path = os.path.join(config.DATA_DIR, f'{name}.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_json(name, data):
+    """小さな状態ファイル（JSON）を保存"""
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    path = os.path.join(config.DATA_DIR, f'{name}.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_frame(name):
+    """単一ファイルのテーブルを読み込み（なければ空のDataFrame）"""
+    path = os.path.join(config.DATA_DIR, f'{name}.parquet')
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+def write_frame(name, df):
+    """単一ファイルのテーブルを保存"""
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    path = os.path.join(config.DATA_DIR, f'{name}.parquet')
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
@@ -0,0 +1,158 @@
+"""
+Query Clusters
+検索クエリの表記ゆれを正規化し、似たクエリをトピック単位にまとめる
+"""
+
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['代表クエリ', 'クエリ数', 'クリック数', '表示回数', 'CTR(%)', '平均順位', '主なクエリ']
+
+NGRAM = 2
+NUM_HASHES = 32
+BANDS = 8  # 1バンド = NUM_HASHES / BANDS 個のハッシュ（類似度 約0.6 以上が候補になる）
+MIN_SIMILARITY = 0.5
+_PRIME = (1 << 31) - 1
+
+_SPACES = re.compile(r'\s+')
+# カタカナ（ァ〜ヶ）→ ひらがな
+_KANA_FOLD = {c: c - 0x60 for c in range(0x30A1, 0x30F7)}
+
+
+def normalize_query(query):
+    """表記ゆれを吸収（NFKC・小文字化・カタカナ→ひらがな・空白の統一）"""
+    text = unicodedata.normalize('NFKC', query).lower().translate(_KANA_FOLD)
+    return _SPACES.sub(' ', text).strip()
+
+
+def _ngram_codes(keys):
+    """各クエリの文字n-gramを整数IDに変換（n-gram ID の連結配列と、クエリごとの個数）"""
+    grams = []
+    lengths = np.empty(len(keys), dtype=np.int64)
+    for i, key in enumerate(keys):
+        text = key.replace(' ', '')
+        if len(text) <= NGRAM:
+            q_grams = [text]
+        else:
+            q_grams = [text[j:j + NGRAM] for j in range(len(text) - NGRAM + 1)]
+        grams.extend(q_grams)
+        lengths[i] = len(q_grams)
+
+    codes, _ = pd.factorize(pd.Series(grams, dtype=object))
+    return codes.astype(np.int64), lengths
+
+
+def _minhash(codes, lengths, seed=0):
+    """n-gram集合のMinHashシグネチャを計算（クエリ数 × NUM_HASHES）"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, NUM_HASHES, dtype=np.int64)
+    b = rng.integers(0, _PRIME, NUM_HASHES, dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    signature = np.empty((len(lengths), NUM_HASHES), dtype=np.uint32)
+    for k in range(NUM_HASHES):
+        hashed = (a[k] * codes + b[k]) % _PRIME
+        signature[:, k] = np.minimum.reduceat(hashed, starts)
+    return signature
+
+
+def _candidate_pairs(signature):
+    """LSH: バンドごとのハッシュが一致するクエリを近傍候補として列挙"""
+    rows_per_band = NUM_HASHES // BANDS
+    mixer = np.random.default_rng(1).integers(1, 1 << 62, rows_per_band, dtype=np.uint64)
+    left, right = [], []
+    for band in range(BANDS):
+        block = signature[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        bucket = (block * mixer).sum(axis=1)
+        order = np.argsort(bucket, kind='stable')
+        sorted_bucket = bucket[order]
+        # 同じバケットの先頭要素と結ぶ（全ペアではなく星型にして件数を線形に抑える）
+        is_start = np.concatenate([[True], sorted_bucket[1:] != sorted_bucket[:-1]])
+        head = order[np.flatnonzero(is_start)[np.cumsum(is_start) - 1]]
+        member = ~is_start
+        left.append(head[member])
+        right.append(order[member])
+    return np.concatenate(left), np.concatenate(right)
+
+
+def _assign_leaders(n, left, right, similarity):
+    """表示回数の多い順に、近傍にいる代表クエリのクラスタへ割り当て
+
+    連結成分にすると A~B~C と連鎖して無関係なクエリまで1つにまとまるため、
+    代表クエリ本人と似ている場合だけ同じクラスタにする（インデックスが小さいほど表示回数が多い）
+    """
+    parent = np.minimum(left, right)
+    child = np.maximum(left, right)
+    order = np.lexsort((-similarity, child))
+    parent, child = parent[order], child[order]
+
+    leader = np.arange(n)
+    bounds = np.flatnonzero(np.concatenate([[True], child[1:] != child[:-1], [True]]))
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        node = child[start]
+        for candidate in parent[start:end].tolist():
+            if leader[candidate] == candidate:
+                leader[node] = candidate
+                break
+    return leader
+
+
+def cluster_queries(queries, top=500, samples=5):
+    """検索クエリをトピッククラスタに集約
+
+    1. normalize_query で表記ゆれを同一クエリにまとめる
+    2. 文字2-gramのMinHash + LSHで近傍候補を探し、代表クエリとの推定類似度が MIN_SIMILARITY 以上なら
+       同じクラスタにする
+    全ペア比較をしないため20万クエリでも数十秒以内で終わる
+    """
+    df = queries.loc[queries['impressions'] > 0, ['query', 'clicks', 'impressions', 'position']]
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    df = df.assign(
+        query=df['query'].astype(str),
+        key=[normalize_query(q) for q in df['query'].astype(str)],
+        weighted_position=df['position'].astype(np.float64) * df['impressions'],
+    ).sort_values('impressions', ascending=False)
+    # 表示名は元の表記のうち表示回数が最も多いもの
+    grouped = df.groupby('key', sort=False).agg(
+        label=('query', 'first'),
+        clicks=('clicks', 'sum'),
+        impressions=('impressions', 'sum'),
+        weighted_position=('weighted_position', 'sum'),
+    ).sort_values('impressions', ascending=False, kind='stable')
+    keys = grouped.index.to_numpy()
+
+    codes, lengths = _ngram_codes(keys)
+    signature = _minhash(codes, lengths)
+    left, right = _candidate_pairs(signature)
+    similarity = (signature[left] == signature[right]).mean(axis=1)
+    close = similarity >= MIN_SIMILARITY
+    grouped['cluster'] = _assign_leaders(len(keys), left[close], right[close], similarity[close])
+
+    clusters = grouped.groupby('cluster').agg(
+        queries=('clicks', 'size'),
+        clicks=('clicks', 'sum'),
+        impressions=('impressions', 'sum'),
+        weighted_position=('weighted_position', 'sum'),
+    )
+    clusters = clusters.nlargest(top, 'impressions')
+
+    # 上位クラスタだけ代表クエリ・主なクエリの文字列を作る
+    members = grouped[grouped['cluster'].isin(clusters.index)].sort_values('impressions', ascending=False)
+    labels = members.set_index('cluster')['label']
+    representative = labels.groupby(level=0).first()
+    examples = labels.groupby(level=0).agg(lambda s: ' / '.join(s.iloc[:samples]))
+
+    result = pd.DataFrame({
+        '代表クエリ': representative.reindex(clusters.index).to_numpy(),
+        'クエリ数': clusters['queries'].to_numpy(),
+        'クリック数': clusters['clicks'].to_numpy(),
+        '表示回数': clusters['impressions'].to_numpy(),
+        'CTR(%)': (clusters['clicks'] / clusters['impressions'] * 100).round(2).to_numpy(),
+        '平均順位': (clusters['weighted_position'] / clusters['impressions']).round(1).to_numpy(),
+        '主なクエリ': examples.reindex(clusters.index).to_numpy(),
+    })
+    return result[COLUMNS]
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Rank Archive
+検索クエリ・ページ別の日次スナップショット（順位・クリック数など）を月単位の追記専用アーカイブに保存
+
+Usage:
+    python rank_archive.py                         # 未保存の確定日を取得して追記（毎日実行）
+    python rank_archive.py --backfill 480          # 過去480日分をさかのぼって保存（初回）
+    python rank_archive.py --history "クエリ"      # クエリの順位推移を表示
+    python rank_archive.py --history "https://..." --kind page
+
+GSCのデータは16か月で消えるため、日ごとの値をローカルに残す。
+列ごとの固定長バイナリ（月ごとのディレクトリ）に追記し、読み込みは np.memmap で必要な行だけ触る
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import config
+from search_console_client import SearchConsoleClient
+
+ARCHIVE_DIR = 'rank_archive'
+KINDS = ['query', 'page']
+INDEX_FILE = '_index.json'
+KEYS_FILE = 'keys.txt'
+
+# 1行 16バイト（10万クエリで1日約1.6MB）
+COLUMNS = {
+    'key': np.uint32,
+    'clicks': np.int32,
+    'impressions': np.int32,
+    'position': np.float32,
+}
+
+
+def _normalize_key(value):
+    """keys.txt に保存する形のキー文字列（1行1キーのため改行は空白にする）"""
+    return value.replace('\n', ' ')
+
+
+class RankArchive:
+    """1種類（query / page）の日次アーカイブ
+
+    <DATA_DIR>/rank_archive/<kind>/keys.txt            クエリ・ページ文字列（行番号がキーID、追記のみ）
+    <DATA_DIR>/rank_archive/<kind>/month=YYYY-MM/*.bin  列ごとの固定長バイナリ（追記のみ）
+    <DATA_DIR>/rank_archive/<kind>/month=YYYY-MM/_index.json  {日付: [開始行, 終了行]}
+    各日の行はキーID順に並べて追記するため、特定キーは日ごとに二分探索で引ける
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.root = os.path.join(config.DATA_DIR, ARCHIVE_DIR, kind)
+        self._keys = None
+
+    def _month_dir(self, month):
+        return os.path.join(self.root, f'month={month}')
+
+    def _months(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[len('month='):] for name in os.listdir(self.root) if name.startswith('month='))
+
+    def _load_index(self, month):
+        path = os.path.join(self._month_dir(month), INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_index(self, month, index):
+        path = os.path.join(self._month_dir(month), INDEX_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _load_keys(self):
+        """キー文字列 → キーID"""
+        if self._keys is None:
+            self._keys = {}
+            path = os.path.join(self.root, KEYS_FILE)
+            if os.path.exists(path):
+                # 区切りは '\n' のみ（キーに含まれる '\r' で行が分かれるとIDがずれる）
+                with open(path, encoding='utf-8', newline='\n') as f:
+                    for i, line in enumerate(f):
+                        self._keys[line.rstrip('\n')] = i
+        return self._keys
+
+    def _key_ids(self, values):
+        """キー文字列をIDに変換（新しいキーは keys.txt に追記）"""
+        keys = self._load_keys()
+        new = []
+        ids = np.empty(len(values), dtype=np.uint32)
+        for i, value in enumerate(values):
+            value = _normalize_key(value)
+            key_id = keys.get(value)
+            if key_id is None:
+                key_id = keys[value] = len(keys)
+                new.append(value)
+            ids[i] = key_id
+        if new:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, KEYS_FILE), 'a', encoding='utf-8', newline='\n') as f:
+                f.write(''.join(v + '\n' for v in new))
+        return ids
+
+    def archived_days(self):
+        """保存済みの日付一覧"""
+        days = set()
+        for month in self._months():
+            days.update(self._load_index(month))
+        return days
+
+    def append_day(self, day, df):
+        """1日分（kind列, clicks, impressions, position）を追記
+
+        保存済みの日と、行がない日（GSCにまだデータがない）は何もしない（次回取り直す）
+        """
+        if df.empty:
+            return False
+        month = day[:7]
+        index = self._load_index(month)
+        if day in index:
+            return False
+
+        month_dir = self._month_dir(month)
+        os.makedirs(month_dir, exist_ok=True)
+        total = max((end for _, end in index.values()), default=0)
+
+        values = df[self.kind]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # fetch_rows の結果はカテゴリ型なので、文字列の変換はカテゴリごとに1回だけ
+            ids = self._key_ids(values.cat.categories.astype(str).tolist())[values.cat.codes.to_numpy()]
+        else:
+            ids = self._key_ids(values.astype(str).tolist())
+        order = np.argsort(ids, kind='stable')
+        columns = {'key': ids, 'clicks': df['clicks'], 'impressions': df['impressions'], 'position': df['position']}
+        for col, dtype in COLUMNS.items():
+            path = os.path.join(month_dir, f'{col}.bin')
+            with open(path, 'ab') as f:
+                # インデックス更新前に中断した追記分は切り捨てる
+                f.truncate(total * np.dtype(dtype).itemsize)
+                np.asarray(columns[col])[order].astype(dtype).tofile(f)
+
+        index[day] = [total, total + len(df)]
+        self._save_index(month, index)
+        return True
+
+    def _memmap(self, month, col, rows):
+        path = os.path.join(self._month_dir(month), f'{col}.bin')
+        return np.memmap(path, dtype=COLUMNS[col], mode='r', shape=(rows,))
+
+    def history(self, key, start_day=None, end_day=None):
+        """1つのクエリ（ページ）の日別推移を取得（対象期間の各日を二分探索、全体は読み込まない）"""
+        key_id = self._load_keys().get(_normalize_key(key))
+        records = []
+        if key_id is not None:
+            for month in self._months():
+                if (start_day and month < start_day[:7]) or (end_day and month > end_day[:7]):
+                    continue
+                index = self._load_index(month)
+                rows = max((end for _, end in index.values()), default=0)
+                if rows == 0:
+                    continue
+                mm = {col: self._memmap(month, col, rows) for col in COLUMNS}
+                for day in sorted(index):
+                    if (start_day and day < start_day) or (end_day and day > end_day):
+                        continue
+                    begin, end = index[day]
+                    pos = begin + int(np.searchsorted(mm['key'][begin:end], key_id))
+                    if pos < end and mm['key'][pos] == key_id:
+                        records.append((day, int(mm['clicks'][pos]), int(mm['impressions'][pos]),
+                                        float(mm['position'][pos])))
+
+        df = pd.DataFrame(records, columns=['date', 'clicks', 'impressions', 'position'])
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def read_day(self, day):
+        """1日分のスナップショットを取得"""
+        month = day[:7]
+        index = self._load_index(month)
+        if day not in index or index[day][0] == index[day][1]:
+            return pd.DataFrame(columns=[self.kind, 'clicks', 'impressions', 'position'])
+
+        begin, end = index[day]
+        rows = max(e for _, e in index.values())
+        data = {col: np.array(self._memmap(month, col, rows)[begin:end]) for col in COLUMNS}
+        names = pd.Index(list(self._load_keys()), dtype=object)
+        df = pd.DataFrame(data).rename(columns={'key': self.kind})
+        df[self.kind] = names[df[self.kind].to_numpy()]
+        return df
+
+    def to_arrow(self, start_day=None, end_day=None):
+        """期間内の全行を pyarrow.Table で取得（local_query 用）
+
+        対象外の月・日は読み込まない。キー列はキーIDをインデックスにした辞書型（文字列は keys.txt の1組だけ）
+        """
+        keys = self._load_keys()
+        parts = {col: [] for col in COLUMNS}
+        dates = []
+        for month in self._months():
+            if (start_day and month < start_day[:7]) or (end_day and month > end_day[:7]):
+                continue
+            index = self._load_index(month)
+            days = [d for d in sorted(index)
+                    if not (start_day and d < start_day) and not (end_day and d > end_day)]
+            rows = max((end for _, end in index.values()), default=0)
+            if not days or rows == 0:
+                continue
+            mm = {col: self._memmap(month, col, rows) for col in COLUMNS}
+            for day in days:
+                begin, end = index[day]
+                for col in COLUMNS:
+                    parts[col].append(mm[col][begin:end])
+                dates.append(np.full(end - begin, np.datetime64(day, 'D')))
+
+        if not dates:
+            columns = {col: np.empty(0, dtype=dtype) for col, dtype in COLUMNS.items()}
+            dates = [np.empty(0, dtype='datetime64[D]')]
+        else:
+            columns = {col: np.concatenate(parts[col]) for col in COLUMNS}
+        names = pa.array(list(keys), type=pa.string())
+        key = pa.DictionaryArray.from_arrays(pa.array(columns.pop('key').astype(np.int32)), names)
+        return pa.table({
+            'date': pa.array(np.concatenate(dates)),
+            self.kind: key,
+            **{col: pa.array(values) for col, values in columns.items()},
+        })
+
+
+def snapshot(backfill_days=None):
+    """未保存の確定日を取得してアーカイブに追記"""
+    backfill_days = backfill_days or config.RANK_ARCHIVE_BACKFILL_DAYS
+    last_day = datetime.now().date() - timedelta(days=config.GSC_FINAL_LAG_DAYS)
+    days = [(last_day - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(backfill_days)][::-1]
+
+    gsc = SearchConsoleClient()
+    for kind in KINDS:
+        archive = RankArchive(kind)
+        archived = archive.archived_days()
+        missing = [d for d in days if d not in archived]
+        print(f"[Archive] {kind}: 未保存 {len(missing)}日")
+        for day in missing:
+            df = gsc.fetch_rows([kind], date_range=(day, day), limit=config.RANK_ARCHIVE_LIMIT)
+            if archive.append_day(day, df):
+                print(f"  → {day}: {len(df):,}行を追記")
+            else:
+                print(f"  → {day}: データがないためスキップ（次回取り直し）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='検索順位の日次アーカイブ')
+    parser.add_argument('--backfill', type=int, default=None, help='さかのぼって保存する日数')
+    parser.add_argument('--history', default=None, help='推移を表示するクエリ（またはページURL）')
+    parser.add_argument('--kind', choices=KINDS, default='query', help='--history の対象')
+    parser.add_argument('--days', type=int, default=730, help='--history で表示する日数')
+    args = parser.parse_args()
+
+    if args.history:
+        start_day = (datetime.now().date() - timedelta(days=args.days)).strftime('%Y-%m-%d')
+        df = RankArchive(args.kind).history(args.history, start_day=start_day)
+        if df.empty:
+            print("データがありません")
+        else:
+            print(df.to_string(index=False))
+        return
+
+    snapshot(args.backfill)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Response Cache
+GA4・Search Console・WordPress のレスポンスをディスクにキャッシュ
+
+dashboard.py / sync_articles.py / charts.py を続けて実行したとき、同じリクエストを再送しない。
+キーは正規化したリクエスト（プロパティ・サイト・期間・ディメンション・指標・フィルタ）のハッシュ。
+スプレッドシートのメタデータは手動の編集でも変わるためキャッシュしない（実行ごとに1回だけ取得）。
+取得元ごとの有効期限（config.RESPONSE_CACHE_TTL）を過ぎたものは取り直し、
+合計サイズが config.RESPONSE_CACHE_MAX_MB を超えたら最後に使った時刻の古いものから削除する
+"""
+
+import hashlib
+import json
+import os
+import time
+import zlib
+import config
+
+CACHE_DIR = 'response_cache'
+INDEX_FILE = '_index.json'
+
+# --no-cache: キャッシュを読み書きしない
+_bypass = False
+_stats = {'hit': 0, 'miss': 0}
+
+
+def _cache_dir():
+    return os.path.join(config.DATA_DIR, CACHE_DIR)
+
+
+def _entry_path(key):
+    return os.path.join(_cache_dir(), f'{key}.bin')
+
+
+def _load_index():
+    path = os.path.join(_cache_dir(), INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError:
+        # 書き込み途中で壊れた場合は空から作り直す
+        return {}
+
+
+def _save_index(index):
+    os.makedirs(_cache_dir(), exist_ok=True)
+    path = os.path.join(_cache_dir(), INDEX_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _remove(index, key):
+    index.pop(key, None)
+    try:
+        os.remove(_entry_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def request_key(source, request):
+    """取得元とリクエストからキャッシュキーを作成（辞書のキー順に依存しない）"""
+    canonical = json.dumps({'source': source, 'request': request},
+                           sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def configure(bypass=False, refresh=False):
+    """実行時の設定（bypass: キャッシュを使わない / refresh: 保存済みのキャッシュを全て破棄）"""
+    global _bypass
+    _bypass = bypass
+    if refresh:
+        invalidate()
+        print("[Cache] レスポンスキャッシュを破棄しました")
+
+
+def invalidate(source=None):
+    """保存済みのレスポンスを破棄（source を指定した場合はその取得元のみ）"""
+    index = _load_index()
+    keys = [k for k, e in index.items() if source is None or e['source'] == source]
+    if not keys:
+        return 0
+    for key in keys:
+        _remove(index, key)
+    _save_index(index)
+    return len(keys)
+
+
+def _evict(index):
+    """合計サイズが上限を超えた分を最後に使った時刻の古い順に削除"""
+    limit = config.RESPONSE_CACHE_MAX_MB * 1024 * 1024
+    total = sum(e['size'] for e in index.values())
+    for key in sorted(index, key=lambda k: index[k]['accessed']):
+        if total <= limit:
+            break
+        total -= index[key]['size']
+        _remove(index, key)
+
+
+def cached(source, request, fetch, dumps=None, loads=None):
+    """キャッシュがあればそれを返し、なければ fetch() を実行して保存
+
+    dumps / loads: レスポンス ⇔ bytes の変換（省略時はJSON）
+    fetch() が None を返した場合（取得失敗など）は保存しない
+    """
+    if _bypass:
+        return fetch()
+
+    dumps = dumps or (lambda value: json.dumps(value, ensure_ascii=False).encode('utf-8'))
+    loads = loads or (lambda data: json.loads(data.decode('utf-8')))
+    key = request_key(source, request)
+    now = time.time()
+
+    index = _load_index()
+    entry = index.get(key)
+    if entry is not None:
+        if now - entry['created'] <= config.RESPONSE_CACHE_TTL.get(source, 0):
+            try:
+                with open(_entry_path(key), 'rb') as f:
+                    value = loads(zlib.decompress(f.read()))
+            except (OSError, zlib.error, ValueError):
+                value = None
+            if value is not None:
+                entry['accessed'] = now
+                _save_index(index)
+                _stats['hit'] += 1
+                return value
+        _remove(index, key)
+
+    _stats['miss'] += 1
+    value = fetch()
+    if value is None:
+        return value
+
+    data = zlib.compress(dumps(value), 3)
+    os.makedirs(_cache_dir(), exist_ok=True)
+    tmp_path = _entry_path(key) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, _entry_path(key))
+
+    # 取得中に他の処理が書いた分も含めるため、インデックスは読み直してから更新
+    index = _load_index()
+    index[key] = {'source': source, 'size': len(data), 'created': now, 'accessed': now}
+    _evict(index)
+    _save_index(index)
+    return value
+
+
+def stats():
+    """この実行でのヒット・ミス件数"""
+    return dict(_stats)
@@ -0,0 +1,100 @@
+"""
+Run Checkpoint
+ダッシュボード実行中に取得したレポートと完了した書き込みを記録し、失敗した実行を途中から再開する
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+import pandas as pd
+import config
+import local_store
+
+RUNS_DIR = 'runs'
+LAST_RUN = 'last_run'
+
+
+def _spec_key(name, spec):
+    """レポート名と取得条件からチェックポイントのファイル名を作成"""
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+    return f'{name}-{digest[:12]}'
+
+
+class RunCheckpoint:
+    """1回の実行（run ID）ごとに取得済みレポートをParquetで保存し、完了した書き込みを記録
+
+    resume=True の場合、前回の実行が完了していなければその run ID を引き継ぎ、
+    取得済みのレポート・完了済みの書き込みをスキップする
+    """
+
+    def __init__(self, resume=False):
+        last = local_store.load_json(LAST_RUN)
+        self.resumed = bool(resume and last and not last.get('completed'))
+        if self.resumed:
+            self.state = last
+            print(f"[Run] 前回の実行 {last['run_id']} を再開"
+                  f"（取得済み{len(last['reports'])}件・書き込み済み{len(last['writes'])}件）")
+        else:
+            if resume:
+                print("[Run] 再開できる実行がないため最初から実行します")
+            self._remove_runs()
+            self.state = {
+                'run_id': datetime.now().strftime('%Y%m%d-%H%M%S'),
+                'reports': {},
+                'writes': [],
+                'values': {},
+                'completed': False,
+            }
+            self._save()
+        self.run_dir = os.path.join(config.DATA_DIR, RUNS_DIR, self.state['run_id'])
+
+    def _save(self):
+        local_store.save_json(LAST_RUN, self.state)
+
+    def _remove_runs(self):
+        """過去の実行のチェックポイントを削除（再開できるのは直前の実行だけ）"""
+        shutil.rmtree(os.path.join(config.DATA_DIR, RUNS_DIR), ignore_errors=True)
+
+    def fetch(self, name, func, **spec):
+        """func(**spec) の結果（DataFrame）を取得。チェックポイントがあればAPIを呼ばずに読み込む"""
+        key = _spec_key(name, spec)
+        path = os.path.join(self.run_dir, f'{key}.parquet')
+        if key in self.state['reports'] and os.path.exists(path):
+            print("  → チェックポイントから読み込み")
+            return pd.read_parquet(path)
+
+        df = func(**spec)
+        os.makedirs(self.run_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.state['reports'][key] = {'name': name, 'spec': spec, 'rows': len(df)}
+        self._save()
+        return df
+
+    def write(self, name, func, *args):
+        """書き込み処理を実行して完了を記録。前回完了済みならスキップして None を返す"""
+        if name in self.state['writes']:
+            print("  → 前回の実行で完了済み（スキップ）")
+            return None
+        result = func(*args)
+        self.state['writes'].append(name)
+        self._save()
+        return result
+
+    def get(self, key, default=None):
+        """記録した値を取得"""
+        return self.state['values'].get(key, default)
+
+    def set(self, key, value):
+        """再開時に必要な値（JSONにできるもの）を記録"""
+        self.state['values'][key] = value
+        self._save()
+
+    def complete(self):
+        """実行完了: チェックポイントを削除（次回の --resume は最初から実行）"""
+        self.state['completed'] = True
+        self._save()
+        shutil.rmtree(self.run_dir, ignore_errors=True)
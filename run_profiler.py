@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Run Profiler
+dashboard.py / sync_articles.py の --profile 用: 処理段階ごとの時間・メモリとCPUサンプリング
+
+Usage:
+    python dashboard.py --profile                          # data/profiles/ にレポートを保存
+    python run_profiler.py diff 前回.json 今回.json        # 2つのレポートを比較
+    python run_profiler.py show レポート.json              # テキスト要約を表示
+
+段階ごとに tracemalloc のピーク・確保量の多い行、経過時間・CPU時間を記録し、
+別スレッドでメインスレッドのスタックを一定間隔でサンプリングする（API待ちも待ち時間として現れる）
+tracemalloc の追跡で割り当ての多い処理は遅くなるため、時間は段階どうしの比較・前回との比較に使う
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+import config
+
+PROFILE_DIR = 'profiles'
+SAMPLE_INTERVAL = 0.005  # 秒
+TOP_ALLOCATIONS = 10
+TOP_STACKS = 300  # レポートに残すスタックの数（件数の多い順）
+FLAME_MIN_SHARE = 0.01  # テキスト要約に表示する最小割合
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class _Sampler(threading.Thread):
+    """メインスレッドのスタックを一定間隔で記録（root;...;leaf 形式で集計）"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stage = None
+        self.paused = False
+        self.stacks = Counter()
+        self.stage_leaves = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = None if self.paused else sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(labels))] += 1
+            if self.stage is not None:
+                self.stage_leaves.setdefault(self.stage, Counter())[labels[0]] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """処理段階ごとのプロファイル（enabled=False の場合は何もしない）
+
+    profiler.stage('GA4取得') を呼ぶと、前の段階を閉じて新しい段階を開始する
+    """
+
+    def __init__(self, name, enabled=False, interval=SAMPLE_INTERVAL):
+        self.name = name
+        self.enabled = enabled
+        self.stages = []
+        self._current = None
+        if not enabled:
+            return
+
+        self.started_at = datetime.now()
+        self._overhead = 0.0
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        tracemalloc.start()
+        self._sampler = _Sampler(threading.get_ident(), interval)
+        self._sampler.start()
+
+    def stage(self, name):
+        """新しい段階を開始"""
+        if self.enabled:
+            self._boundary(name)
+
+    def _allocation_stats(self):
+        """確保元の行ごとの {行: (サイズ, 個数)}"""
+        return {
+            stat.traceback[0]: (stat.size, stat.count)
+            for stat in tracemalloc.take_snapshot().statistics('lineno')
+        }
+
+    def _boundary(self, next_name):
+        """前の段階を閉じて次の段階を開始（スナップショットの集計時間は段階に含めない）"""
+        wall, cpu = time.perf_counter(), time.process_time()
+        memory, peak = tracemalloc.get_traced_memory()
+        self._sampler.stage = None
+        self._sampler.paused = True
+
+        stats = self._allocation_stats()
+        current = self._current
+        if current is not None:
+            diffs = []
+            for frame, (size, count) in stats.items():
+                before_size, before_count = current['stats'].get(frame, (0, 0))
+                if size > before_size:
+                    diffs.append((size - before_size, count - before_count, frame))
+            diffs.sort(key=lambda d: d[0], reverse=True)
+            self.stages.append({
+                'name': current['name'],
+                'wall_s': round(wall - current['wall'], 3),
+                'cpu_s': round(cpu - current['cpu'], 3),
+                'peak_mb': round((peak - current['memory']) / 1024 / 1024, 2),
+                'retained_mb': round((memory - current['memory']) / 1024 / 1024, 2),
+                'top_allocations': [
+                    {'site': f'{os.path.basename(frame.filename)}:{frame.lineno}',
+                     'kb': round(size / 1024, 1), 'count': count}
+                    for size, count, frame in diffs[:TOP_ALLOCATIONS]
+                ],
+            })
+
+        self._current = None
+        if next_name is not None:
+            tracemalloc.reset_peak()
+            self._current = {
+                'name': next_name,
+                'stats': stats,
+                'memory': tracemalloc.get_traced_memory()[0],
+                'wall': time.perf_counter(),
+                'cpu': time.process_time(),
+            }
+            self._sampler.stage = next_name
+        self._overhead += time.perf_counter() - wall
+        self._sampler.paused = False
+
+    def finish(self):
+        """最後の段階を閉じてレポート（JSON + テキスト要約）を保存。保存先のJSONパスを返す"""
+        if not self.enabled:
+            return None
+        self._boundary(None)
+        self._sampler.stop()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        stage_leaves = self._sampler.stage_leaves
+        for stage in self.stages:
+            leaves = stage_leaves.get(stage['name'], Counter())
+            stage['samples'] = sum(leaves.values())
+            stage['top_functions'] = dict(leaves.most_common(TOP_ALLOCATIONS))
+
+        report = {
+            'name': self.name,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': sys.version.split()[0],
+            'interval_s': self._sampler.interval,
+            'wall_s': round(time.perf_counter() - self._start_wall, 3),
+            'cpu_s': round(time.process_time() - self._start_cpu, 3),
+            'peak_mb': round(peak / 1024 / 1024, 2),
+            'profiler_overhead_s': round(self._overhead, 3),
+            'stages': self.stages,
+            'stacks': dict(self._sampler.stacks.most_common(TOP_STACKS)),
+        }
+
+        out_dir = os.path.join(config.DATA_DIR, PROFILE_DIR)
+        os.makedirs(out_dir, exist_ok=True)
+        base = os.path.join(out_dir, f"{self.name}-{self.started_at.strftime('%Y%m%d-%H%M%S')}")
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(format_report(report))
+        print(f"[Profile] レポートを保存しました: {base}.json / .txt")
+        return base + '.json'
+
+
+def _flame_lines(stacks, min_share=FLAME_MIN_SHARE):
+    """折りたたみスタックをツリー形式のテキストにする（割合が min_share 未満の枝は省略）"""
+    total = sum(stacks.values())
+    if not total:
+        return []
+    tree = {}
+    for stack, count in stacks.items():
+        node = tree
+        for label in stack.split(';'):
+            entry = node.setdefault(label, [0, {}])
+            entry[0] += count
+            node = entry[1]
+
+    lines = []
+
+    def walk(node, depth):
+        for label, (count, children) in sorted(node.items(), key=lambda kv: -kv[1][0]):
+            if count / total < min_share:
+                continue
+            # 子が1つだけで件数も同じ区間（呼び出しの中継）は1行にまとめる
+            chain = [label]
+            while len(children) == 1:
+                (child, (child_count, grandchildren)), = children.items()
+                if child_count != count:
+                    break
+                chain.append(child)
+                children = grandchildren
+            if len(chain) > 3:
+                chain = [chain[0], '…', chain[-1]]
+            lines.append(f"{count / total * 100:5.1f}% {'  ' * depth}{' > '.join(chain)}")
+            walk(children, depth + 1)
+
+    walk(tree, 0)
+    return lines
+
+
+def format_report(report):
+    """レポートのテキスト要約（段階ごとの表 + フレーム要約）"""
+    lines = [
+        f"{report['name']} {report['started_at']} (Python {report['python']})",
+        f"合計: {report['wall_s']:.1f}秒 / CPU {report['cpu_s']:.1f}秒 / ピーク {report['peak_mb']:.1f}MB"
+        f"（うち計測処理 {report['profiler_overhead_s']:.1f}秒）",
+        '',
+        f"{'段階':<24}{'経過(秒)':>10}{'CPU(秒)':>10}{'ピーク(MB)':>12}{'保持(MB)':>10}",
+    ]
+    for stage in report['stages']:
+        lines.append(
+            f"{stage['name']:<24}{stage['wall_s']:>10.2f}{stage['cpu_s']:>10.2f}"
+            f"{stage['peak_mb']:>12.1f}{stage['retained_mb']:>10.1f}"
+        )
+    for stage in report['stages']:
+        lines.append('')
+        lines.append(f"== {stage['name']} ==")
+        for func, count in stage.get('top_functions', {}).items():
+            share = count / stage['samples'] * 100 if stage['samples'] else 0
+            lines.append(f"  {share:5.1f}% {func}")
+        for alloc in stage['top_allocations'][:5]:
+            lines.append(f"  {alloc['kb']:>10,.0f}KB {alloc['site']}")
+    lines.append('')
+    lines.append('== フレーム要約（サンプル数の割合） ==')
+    lines += _flame_lines(report['stacks'])
+    return '\n'.join(lines) + '\n'
+
+
+def diff_reports(before, after):
+    """2つのレポートの段階ごとの差分（テキスト）"""
+    lines = [
+        f"前: {before['name']} {before['started_at']}  後: {after['name']} {after['started_at']}",
+        f"合計: {before['wall_s']:.1f}秒 → {after['wall_s']:.1f}秒 ({after['wall_s'] - before['wall_s']:+.1f})"
+        f" / ピーク {before['peak_mb']:.1f}MB → {after['peak_mb']:.1f}MB ({after['peak_mb'] - before['peak_mb']:+.1f})",
+        '',
+        f"{'段階':<24}{'経過(秒)':>12}{'CPU(秒)':>12}{'ピーク(MB)':>12}",
+    ]
+    before_stages = {s['name']: s for s in before['stages']}
+    after_stages = {s['name']: s for s in after['stages']}
+    for name in list(before_stages) + [n for n in after_stages if n not in before_stages]:
+        b, a = before_stages.get(name), after_stages.get(name)
+        if b is None or a is None:
+            lines.append(f"{name:<24}{'(追加)' if b is None else '(削除)':>12}")
+            continue
+        lines.append(
+            f"{name:<24}{a['wall_s'] - b['wall_s']:>+12.2f}{a['cpu_s'] - b['cpu_s']:>+12.2f}"
+            f"{a['peak_mb'] - b['peak_mb']:>+12.1f}"
+        )
+
+    # 関数ごとのサンプル割合の変化（上位）
+    def leaf_shares(report):
+        leaves = Counter()
+        for stack, count in report['stacks'].items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return {k: v / total for k, v in leaves.items()}
+
+    b_shares, a_shares = leaf_shares(before), leaf_shares(after)
+    changes = sorted(
+        ((a_shares.get(k, 0) - b_shares.get(k, 0), k) for k in set(b_shares) | set(a_shares)),
+        key=lambda x: -abs(x[0])
+    )
+    lines.append('')
+    lines.append('== 関数ごとのサンプル割合の変化 ==')
+    for change, func in changes[:15]:
+        if abs(change) >= FLAME_MIN_SHARE:
+            lines.append(f"  {change * 100:+6.1f}pt {func}")
+    return '\n'.join(lines) + '\n'
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='プロファイルレポートの表示・比較')
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help='テキスト要約を表示')
+    show.add_argument('report')
+    diff = sub.add_parser('diff', help='2つのレポートを比較')
+    diff.add_argument('before')
+    diff.add_argument('after')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print(format_report(_load(args.report)), end='')
+    else:
+        print(diff_reports(_load(args.before), _load(args.after)), end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,173 +3,245 @@ Google Search Console API Client
 検索パフォーマンスデータを取得
 """
 
+import os
+import shutil
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
 import config
+import local_store
+import response_cache
 from auth import get_search_console_service
 
+DAILY_TABLE = 'gsc_daily'
+DAILY_COLUMNS = ['clicks', 'impressions', 'ctr', 'position']
+
+# APIの1リクエストあたりの最大行数
+API_ROW_LIMIT = 25000
+
+# spill_rows の書き出し先（<DATA_DIR>/gsc_spill/<名前>/part-NNNNN.parquet）
+SPILL_DIR = 'gsc_spill'
+
 
 class SearchConsoleClient:
     def __init__(self):
         self.service = get_search_console_service()
         self.site_url = config.SEARCH_CONSOLE_SITE_URL
 
+    def _execute_query(self, request_body):
+        """APIリクエストを実行（レスポンス全体を返す）"""
+        return response_cache.cached(
+            'gsc', {'site': self.site_url, 'body': request_body},
+            lambda: self.service.searchanalytics().query(
+                siteUrl=self.site_url,
+                body=request_body
+            ).execute()
+        )
+
     def _execute_request(self, request_body):
         """APIリクエストを実行"""
-        response = self.service.searchanalytics().query(
-            siteUrl=self.site_url,
-            body=request_body
-        ).execute()
-        return response.get('rows', [])
+        return self._execute_query(request_body).get('rows', [])
+
+    def _decode_rows(self, rows, dimensions, vocabs):
+        """APIレスポンスの行を列ごとに直接デコード（行ごとの辞書は作らない）
+
+        クエリ・ページなどの文字列は vocabs の辞書で int32 のコードに変換し、
+        同じ文字列は1回だけ保持する。clicks/impressions は int32、ctr/position は float32
+        """
+        n = len(rows)
+        data = {}
+        for i, dim in enumerate(dimensions):
+            if dim == 'date':
+                data[dim] = pd.to_datetime([row['keys'][i] for row in rows]).to_numpy()
+            else:
+                vocab = vocabs[dim]
+                data[dim] = np.fromiter(
+                    (vocab.setdefault(row['keys'][i], len(vocab)) for row in rows),
+                    dtype=np.int32, count=n
+                )
+
+        data['clicks'] = np.fromiter((row['clicks'] for row in rows), dtype=np.int32, count=n)
+        data['impressions'] = np.fromiter((row['impressions'] for row in rows), dtype=np.int32, count=n)
+        ctr = np.fromiter((row['ctr'] for row in rows), dtype=np.float64, count=n)
+        data['ctr'] = (ctr * 100).round(2).astype(np.float32)
+        position = np.fromiter((row['position'] for row in rows), dtype=np.float64, count=n)
+        data['position'] = position.round(1).astype(np.float32)
+        return data
+
+    def _to_frame(self, data, dimensions, vocabs):
+        """デコード済みの列からDataFrameを作成（文字列列はカテゴリ型）"""
+        for dim in dimensions:
+            if dim != 'date':
+                categories = pd.Index(list(vocabs[dim]), dtype=object)
+                data[dim] = pd.Categorical.from_codes(data[dim], categories=categories)
+        return pd.DataFrame(data)
+
+    def _iter_pages(self, dimensions, days=30, limit=None, filters=None, date_range=None):
+        """APIを1ページ（最大25,000行）ずつ呼び出して行を返す
+
+        date_range: (開始日, 終了日) の 'YYYY-MM-DD' 文字列（指定時は days より優先）
+        """
+        if date_range:
+            start_date, end_date = (datetime.strptime(d, '%Y-%m-%d') for d in date_range)
+        else:
+            end_date = datetime.now() - timedelta(days=3)
+            start_date = end_date - timedelta(days=days)
+
+        start_row = 0
+        while limit is None or start_row < limit:
+            row_limit = API_ROW_LIMIT if limit is None else min(API_ROW_LIMIT, limit - start_row)
+            request_body = {
+                'startDate': start_date.strftime('%Y-%m-%d'),
+                'endDate': end_date.strftime('%Y-%m-%d'),
+                'dimensions': dimensions,
+                'rowLimit': row_limit,
+                'startRow': start_row
+            }
+            if filters:
+                request_body['dimensionFilterGroups'] = [{'filters': filters}]
+
+            rows = self._execute_request(request_body)
+            if not rows:
+                break
+            yield rows
+
+            start_row += len(rows)
+            if len(rows) < row_limit:
+                break
+
+    def fetch_rows(self, dimensions, days=30, limit=None, filters=None, date_range=None):
+        """全行（またはlimit行）を取得して1つのコンパクトなDataFrameにする"""
+        vocabs = {dim: {} for dim in dimensions}
+        chunks = []
+        for rows in self._iter_pages(dimensions, days=days, limit=limit, filters=filters,
+                                     date_range=date_range):
+            chunks.append(self._decode_rows(rows, dimensions, vocabs))
+            del rows
+
+        if chunks:
+            data = {col: np.concatenate([c[col] for c in chunks]) for col in chunks[0]}
+        else:
+            data = self._decode_rows([], dimensions, vocabs)
+        del chunks
+        return self._to_frame(data, dimensions, vocabs)
+
+    def iter_rows(self, dimensions, days=30, limit=None, filters=None):
+        """ページごとに独立したコンパクトなDataFrameを返す"""
+        for rows in self._iter_pages(dimensions, days=days, limit=limit, filters=filters):
+            vocabs = {dim: {} for dim in dimensions}
+            yield self._to_frame(self._decode_rows(rows, dimensions, vocabs), dimensions, vocabs)
+
+    def spill_rows(self, dimensions, name, days=30, limit=None, filters=None):
+        """メモリに載らない規模のデータ用: ページごとにParquetへ書き出して pyarrow.dataset で返す
+
+        メモリに持つのは1ページ分だけ。読み込みは dataset.to_table(columns=..., filter=...) で
+        必要な列・行だけ行う。前回同じ name で書き出したファイルは削除する
+        """
+        path = os.path.join(config.DATA_DIR, SPILL_DIR, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        pages = 0
+        for df in self.iter_rows(dimensions, days=days, limit=limit, filters=filters):
+            df.to_parquet(os.path.join(path, f'part-{pages:05d}.parquet'), index=False)
+            pages += 1
+        if not pages:
+            # 行がない場合も列構成を返すため空のファイルを書く
+            vocabs = {dim: {} for dim in dimensions}
+            empty = self._to_frame(self._decode_rows([], dimensions, vocabs), dimensions, vocabs)
+            empty.to_parquet(os.path.join(path, 'part-00000.parquet'), index=False)
+        return ds.dataset(path, format='parquet')
 
     def get_search_queries(self, days=30, limit=100):
         """検索クエリ別パフォーマンスを取得"""
-        end_date = datetime.now() - timedelta(days=3)  # GSCは3日前まで
-        start_date = end_date - timedelta(days=days)
-
-        request_body = {
-            'startDate': start_date.strftime('%Y-%m-%d'),
-            'endDate': end_date.strftime('%Y-%m-%d'),
-            'dimensions': ['query'],
-            'rowLimit': limit,
-            'startRow': 0
-        }
-
-        rows = self._execute_request(request_body)
-
-        data = []
-        for row in rows:
-            data.append({
-                'query': row['keys'][0],
-                'clicks': row['clicks'],
-                'impressions': row['impressions'],
-                'ctr': round(row['ctr'] * 100, 2),
-                'position': round(row['position'], 1)
-            })
-
-        df = pd.DataFrame(data)
+        df = self.fetch_rows(['query'], days=days, limit=limit)
         if not df.empty:
             df = df.sort_values('impressions', ascending=False)
         return df
 
     def get_page_performance(self, days=30, limit=100):
         """ページ別検索パフォーマンスを取得"""
-        end_date = datetime.now() - timedelta(days=3)
-        start_date = end_date - timedelta(days=days)
-
-        request_body = {
-            'startDate': start_date.strftime('%Y-%m-%d'),
-            'endDate': end_date.strftime('%Y-%m-%d'),
-            'dimensions': ['page'],
-            'rowLimit': limit,
-            'startRow': 0
-        }
-
-        rows = self._execute_request(request_body)
-
-        data = []
-        for row in rows:
-            data.append({
-                'page': row['keys'][0],
-                'clicks': row['clicks'],
-                'impressions': row['impressions'],
-                'ctr': round(row['ctr'] * 100, 2),
-                'position': round(row['position'], 1)
-            })
-
-        df = pd.DataFrame(data)
+        df = self.fetch_rows(['page'], days=days, limit=limit)
         if not df.empty:
             df = df.sort_values('clicks', ascending=False)
         return df
 
+    def get_page_query_performance(self, days=30, limit=None):
+        """ページ×クエリ別の検索パフォーマンスを取得（ロングテール全体）
+
+        行数が多いためページごとにディスクへ書き出し、pyarrow.dataset で返す（spill_rows）
+        """
+        return self.spill_rows(['page', 'query'], 'page_query', days=days, limit=limit)
+
     def get_daily_performance(self, days=30):
-        """日別検索パフォーマンスを取得"""
-        end_date = datetime.now() - timedelta(days=3)
-        start_date = end_date - timedelta(days=days)
+        """日別検索パフォーマンスを取得
+
+        直近の未確定日も dataState='all' で取得し、速報値としてローカルに保存する。
+        次回以降は未取得・速報値の日だけを再取得して確定値に置き換える。
+        """
+        today = datetime.now().date()
+        start_date = today - timedelta(days=days + config.GSC_FINAL_LAG_DAYS)
+        keys = [
+            (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
+            for i in range((today - start_date).days + 1)
+        ]
+
+        pending = local_store.pending_partitions(DAILY_TABLE, keys)
+        if pending:
+            self._fetch_daily_partitions(pending, today)
+
+        df = local_store.read_table(DAILY_TABLE, keys[0], keys[-1])
+        if not df.empty:
+            df = df.sort_values('date').reset_index(drop=True)
+        return df
 
+    def _fetch_daily_partitions(self, keys, today):
+        """指定日の日別データを取得してローカルに保存"""
         request_body = {
-            'startDate': start_date.strftime('%Y-%m-%d'),
-            'endDate': end_date.strftime('%Y-%m-%d'),
+            'startDate': keys[0],
+            'endDate': keys[-1],
             'dimensions': ['date'],
-            'rowLimit': days,
+            'dataState': 'all',
+            'rowLimit': (today - datetime.strptime(keys[0], '%Y-%m-%d').date()).days + 1,
             'startRow': 0
         }
 
-        rows = self._execute_request(request_body)
+        response = self._execute_query(request_body)
+        # dataState='all' の場合、未確定データの開始日が返る
+        first_incomplete = response.get('metadata', {}).get('firstIncompleteDate')
+        lag_start = (today - timedelta(days=config.GSC_FINAL_LAG_DAYS)).strftime('%Y-%m-%d')
 
-        data = []
-        for row in rows:
-            data.append({
-                'date': row['keys'][0],
+        rows_by_date = {}
+        for row in response.get('rows', []):
+            rows_by_date[row['keys'][0]] = {
                 'clicks': row['clicks'],
                 'impressions': row['impressions'],
                 'ctr': round(row['ctr'] * 100, 2),
                 'position': round(row['position'], 1)
-            })
+            }
 
-        df = pd.DataFrame(data)
-        if not df.empty:
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date')
-        return df
+        partitions = []
+        for key in keys:
+            row = rows_by_date.get(key)
+            if first_incomplete and key >= first_incomplete:
+                provisional = True
+            else:
+                # データがまだ無い直近日は後で再取得する
+                provisional = row is None and key > lag_start
+            df = pd.DataFrame([row] if row else [], columns=DAILY_COLUMNS)
+            partitions.append((key, df, provisional))
+
+        local_store.write_partitions(DAILY_TABLE, partitions)
 
     def get_query_by_page(self, page_url, days=30, limit=20):
         """特定ページの検索クエリを取得"""
-        end_date = datetime.now() - timedelta(days=3)
-        start_date = end_date - timedelta(days=days)
-
-        request_body = {
-            'startDate': start_date.strftime('%Y-%m-%d'),
-            'endDate': end_date.strftime('%Y-%m-%d'),
-            'dimensions': ['query'],
-            'dimensionFilterGroups': [{
-                'filters': [{
-                    'dimension': 'page',
-                    'operator': 'equals',
-                    'expression': page_url
-                }]
-            }],
-            'rowLimit': limit,
-            'startRow': 0
-        }
-
-        rows = self._execute_request(request_body)
-
-        data = []
-        for row in rows:
-            data.append({
-                'query': row['keys'][0],
-                'clicks': row['clicks'],
-                'impressions': row['impressions'],
-                'ctr': round(row['ctr'] * 100, 2),
-                'position': round(row['position'], 1)
-            })
-
-        return pd.DataFrame(data)
+        filters = [{
+            'dimension': 'page',
+            'operator': 'equals',
+            'expression': page_url
+        }]
+        return self.fetch_rows(['query'], days=days, limit=limit, filters=filters)
 
     def get_device_performance(self, days=30):
         """デバイス別検索パフォーマンスを取得"""
-        end_date = datetime.now() - timedelta(days=3)
-        start_date = end_date - timedelta(days=days)
-
-        request_body = {
-            'startDate': start_date.strftime('%Y-%m-%d'),
-            'endDate': end_date.strftime('%Y-%m-%d'),
-            'dimensions': ['device'],
-            'rowLimit': 10,
-            'startRow': 0
-        }
-
-        rows = self._execute_request(request_body)
-
-        data = []
-        for row in rows:
-            data.append({
-                'device': row['keys'][0],
-                'clicks': row['clicks'],
-                'impressions': row['impressions'],
-                'ctr': round(row['ctr'] * 100, 2),
-                'position': round(row['position'], 1)
-            })
-
-        return pd.DataFrame(data)
+        return self.fetch_rows(['device'], days=days, limit=10)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+静的ダッシュボードのローカル配信サーバー
+
+Usage:
+    python serve_dashboard.py              # http://localhost:8000/ で配信
+    python serve_dashboard.py --port 8080
+
+static_export.py が書き出したファイルをメモリにキャッシュして配信する。
+ETag / Cache-Control / Range（大きな表の分割取得）に対応
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import config
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+}
+# URLにハッシュ（?v=）が付いたデータは内容が変わらないため長期キャッシュ
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# それ以外は毎回ETagで再検証（変更がなければ304）
+REVALIDATE_CACHE = 'no-cache'
+
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+class FileCache:
+    """配信ファイルのキャッシュ（更新時刻が変わったときだけ読み直す）"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, url_path):
+        """URLパス → {gzip, identity, etag} （なければ None）
+
+        data/<ビュー名>.json は書き出し済みの .json.gz から作る
+        """
+        rel = url_path.lstrip('/') or 'index.html'
+        path = os.path.abspath(os.path.join(self.root, rel))
+        gz_path = path + '.gz'
+        if not path.startswith(self.root + os.sep):
+            return None
+        source = gz_path if os.path.isfile(gz_path) else path
+        if not os.path.isfile(source):
+            return None
+
+        mtime = os.stat(source).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry['mtime'] == mtime:
+                return entry
+
+        with open(source, 'rb') as f:
+            raw = f.read()
+        if source == gz_path:
+            compressed, body = raw, gzip.decompress(raw)
+        else:
+            compressed, body = gzip.compress(raw, compresslevel=9, mtime=0), raw
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        entry = {
+            'mtime': mtime,
+            'identity': body,
+            'gzip': compressed,
+            'etag': f'"{digest}"',
+            'gzip_etag': f'"{digest}-gz"',
+            'type': CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'),
+        }
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+
+def parse_range(header, size):
+    """Rangeヘッダ（単一範囲）を (開始, 終了) に変換。不正なら None、範囲外なら False"""
+    match = _RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = size - 1 if end == '' else min(int(end), size - 1)
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    cache = None
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def _respond(self, head):
+        url = urlsplit(self.path)
+        entry = self.cache.get(url.path)
+        if entry is None:
+            self.send_error(404)
+            return
+
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = entry['gzip'] if use_gzip else entry['identity']
+        etag = entry['gzip_etag'] if use_gzip else entry['etag']
+        cache_control = IMMUTABLE_CACHE if 'v' in parse_qs(url.query) else REVALIDATE_CACHE
+
+        if etag in [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self._common_headers(etag, cache_control, use_gzip)
+            self.end_headers()
+            return
+
+        byte_range = None
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == etag):
+            byte_range = parse_range(range_header, len(body))
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self._common_headers(etag, cache_control, use_gzip)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        self.send_response(206 if byte_range else 200)
+        self._common_headers(etag, cache_control, use_gzip)
+        self.send_header('Content-Type', entry['type'])
+        if byte_range:
+            start, end = byte_range
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+            body = body[start:end + 1]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _common_headers(self, etag, cache_control, use_gzip):
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+
+
+def serve(directory=None, port=8000, host='127.0.0.1'):
+    """書き出し済みの静的ダッシュボードを配信"""
+    directory = directory or config.EXPORT_DIR
+    handler = type('Handler', (DashboardHandler,), {'cache': FileCache(directory)})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"[Serve] {os.path.abspath(directory)} を http://{host}:{port}/ で配信中（Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='静的ダッシュボードのローカル配信')
+    parser.add_argument('--port', type=int, default=8000, help='ポート番号')
+    parser.add_argument('--host', default='127.0.0.1', help='待ち受けアドレス')
+    parser.add_argument('--dir', default=None, help='配信するディレクトリ（既定: config.EXPORT_DIR）')
+    args = parser.parse_args()
+
+    serve(args.dir, args.port, args.host)
+
+
+if __name__ == '__main__':
+    main()
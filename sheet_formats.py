@@ -0,0 +1,73 @@
+"""
+Sheet Formatting Spec
+各シートの書式設定（見出し・数値形式・条件付き書式）
+"""
+
+from gspread_formatting import (
+    CellFormat,
+    Color,
+    GradientRule,
+    InterpolationPoint,
+    NumberFormat,
+    TextFormat,
+)
+
+# 表形式シートの見出し行
+HEADER_FORMAT = CellFormat(
+    textFormat=TextFormat(bold=True),
+    backgroundColor=Color(0.91, 0.94, 0.99)
+)
+
+# サマリー・時間帯分析などのタイトルセル（A1）
+TITLE_FORMAT = CellFormat(textFormat=TextFormat(bold=True, fontSize=12))
+
+COUNT_FORMAT = CellFormat(numberFormat=NumberFormat(type='NUMBER', pattern='#,##0'))
+DECIMAL1_FORMAT = CellFormat(numberFormat=NumberFormat(type='NUMBER', pattern='0.0'))
+DECIMAL2_FORMAT = CellFormat(numberFormat=NumberFormat(type='NUMBER', pattern='0.00'))
+
+# 見出し名 → 列の数値形式
+COLUMN_FORMATS = {
+    'PV数': COUNT_FORMAT,
+    'セッション数': COUNT_FORMAT,
+    'ユーザー数': COUNT_FORMAT,
+    'クリック数': COUNT_FORMAT,
+    '表示回数': COUNT_FORMAT,
+    '内部リンク数': COUNT_FORMAT,
+    '外部リンク数': COUNT_FORMAT,
+    '被リンク数': COUNT_FORMAT,
+    '発リンク数': COUNT_FORMAT,
+    '競合ページ数': COUNT_FORMAT,
+    'クエリ数': COUNT_FORMAT,
+    '推定損失クリック': DECIMAL1_FORMAT,
+    '平均滞在時間': DECIMAL1_FORMAT,
+    '平均滞在時間(秒)': DECIMAL1_FORMAT,
+    '直帰率(%)': DECIMAL1_FORMAT,
+    '平均順位': DECIMAL1_FORMAT,
+    'CTR(%)': DECIMAL2_FORMAT,
+    '最良CTR(%)': DECIMAL2_FORMAT,
+}
+
+# GA4の多次元キューブから集計した概算値の列（sheets_client._estimated）
+for _header in ['ユーザー数', '平均滞在時間', '平均滞在時間(秒)']:
+    COLUMN_FORMATS[f'{_header}(概算)'] = COLUMN_FORMATS[_header]
+
+# トレンド分析の追加列（trend_engine.trend_columns）
+for _label in ['PV', 'クリック', '表示回数']:
+    COLUMN_FORMATS[f'{_label}(7日計)'] = COUNT_FORMAT
+    COLUMN_FORMATS[f'{_label}(28日計)'] = COUNT_FORMAT
+    COLUMN_FORMATS[f'{_label}(EWMA)'] = DECIMAL1_FORMAT
+    COLUMN_FORMATS[f'{_label}前週比(%)'] = DECIMAL1_FORMAT
+    COLUMN_FORMATS[f'{_label}前年比(%)'] = DECIMAL1_FORMAT
+
+# 見出し名 → 条件付き書式（色スケール）
+# 平均順位は小さいほど良いので 緑→黄→赤
+GRADIENT_COLUMNS = {
+    '平均順位': GradientRule(
+        minpoint=InterpolationPoint(color=Color(0.34, 0.73, 0.54), type='MIN'),
+        midpoint=InterpolationPoint(color=Color(1, 0.84, 0.4), type='PERCENTILE', value='50'),
+        maxpoint=InterpolationPoint(color=Color(0.9, 0.49, 0.45), type='MAX')
+    ),
+}
+
+# 見出し行を固定する行数
+FROZEN_HEADER_ROWS = 1
@@ -3,93 +3,615 @@ Google Sheets API Client
 スプレッドシートにデータを書き込み・グラフ設定
 """
 
+import gc
+import hashlib
+import itertools
+import json
+import numbers
 import gspread
+import numpy as np
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime
+from gspread.utils import rowcol_to_a1
+from gspread_formatting import ConditionalFormatRule
+from gspread_formatting.batch_update_requests import format_cell_ranges, set_frozen
 import config
+import sheet_formats
 from auth import get_sheets_client
 
 
+# スプレッドシート全体のセル数上限
+CELL_LIMIT = 10_000_000
+
+# 適用済み書式のハッシュを保存するデベロッパーメタデータのキー
+FORMAT_HASH_KEY = 'machiyomi_format_hash'
+
+# 1回のbatch_updateで送る最大行数（これより大きい表はチャンクに分けて送信）
+WRITE_CHUNK_ROWS = 20000
+
+
+def _cell_data(value):
+    """セル値をupdateCells用のCellDataに変換（RAW書き込みと同じ扱い）"""
+    if value is None or value == '' or value != value:
+        return {}
+    if isinstance(value, (bool, np.bool_)):
+        return {'userEnteredValue': {'boolValue': bool(value)}}
+    if isinstance(value, numbers.Number):
+        return {'userEnteredValue': {'numberValue': float(value)}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+
+def _string_cells(values):
+    return [{'userEnteredValue': {'stringValue': v}} if v else {} for v in values]
+
+
+def _unique_cells(values):
+    """重複を除いた値（pd.Index）をCellDataのリストに変換（型の判定・日付の整形は1回）"""
+    dtype = values.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return _string_cells(values.strftime('%Y-%m-%d').tolist())
+    if pd.api.types.is_bool_dtype(dtype):
+        return [{'userEnteredValue': {'boolValue': v}} for v in values.tolist()]
+    if pd.api.types.is_numeric_dtype(dtype):
+        # float32列は10進の桁に戻す（3.3 が 3.2999999523 と書き込まれないように）
+        if dtype == np.float32:
+            values = values.astype(str)
+        return [{'userEnteredValue': {'numberValue': v}} for v in values.astype('float64').tolist()]
+
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == 'string':
+        return _string_cells(values.tolist())
+    if kind in ('datetime', 'datetime64', 'date'):
+        return _string_cells(pd.to_datetime(values).strftime('%Y-%m-%d').tolist())
+    # 型が混在する列だけ値ごとに判定
+    return [
+        _cell_data(v.strftime('%Y-%m-%d') if isinstance(v, (datetime, pd.Timestamp)) else v)
+        for v in values.tolist()
+    ]
+
+
+def _column_cells(series):
+    """1列分をCellDataのリストに変換
+
+    重複を除いた値だけ変換し、各行は同じCellDataを参照する（欠損は空のCellData）
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+        # 日付単位で書き込むため、時刻を切り捨ててから重複を除く
+        codes, uniques = pd.factorize(series.dt.normalize())
+    else:
+        codes, uniques = pd.factorize(series)
+    cells = np.empty(len(uniques) + 1, dtype=object)
+    cells[:-1] = _unique_cells(pd.Index(uniques))
+    cells[-1] = {}
+    return cells[codes].tolist()
+
+
+@contextmanager
+def _gc_paused():
+    """大量の辞書を作る間はGCを止める（循環参照を作らないため安全、変換時間の大半がGCだった）"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def frame_cells(df):
+    """DataFrameをupdateCells用の行（{'values': [CellData, ...]}）のリストに変換"""
+    with _gc_paused():
+        columns = [_column_cells(df[col]) for col in df.columns]
+        return [{'values': list(cells)} for cells in zip(*columns)]
+
+
+def iter_frame_cells(df, chunk_rows):
+    """frame_cells をチャンクごとに返す（変換途中のリストを1チャンク分しか持たない）"""
+    for start in range(0, len(df), chunk_rows):
+        yield frame_cells(df.iloc[start:start + chunk_rows])
+
+
+def _int_columns(df, columns):
+    """指定列をPythonのintのリストとして取得"""
+    return [df[col].astype(int).tolist() for col in columns]
+
+
+def _rule_signature(rule):
+    """条件付き書式ルールの識別用の文字列（種類と適用範囲）
+
+    APIの返すGridRangeは0の項目を省略するため、0の項目とシートIDは比較に含めない
+    """
+    kind = 'gradientRule' if 'gradientRule' in rule else 'booleanRule'
+    ranges = [{k: v for k, v in r.items() if k != 'sheetId' and v} for r in rule.get('ranges', [])]
+    return json.dumps([kind, ranges], sort_keys=True)
+
+
+def _update_cells_request(sheet_id, start_row, cols, rows):
+    return {'updateCells': {
+        'range': {
+            'sheetId': sheet_id,
+            'startRowIndex': start_row,
+            'endRowIndex': start_row + len(rows),
+            'startColumnIndex': 0,
+            'endColumnIndex': cols
+        },
+        'rows': rows,
+        'fields': 'userEnteredValue'
+    }}
+
+
+def _rollup_daily(df, date_col, sum_cols):
+    """古い日別行を週・月単位に集約（config.ROLLUP_FREQ が設定されている場合のみ）
+
+    合計系の列は合計、それ以外の数値列は平均、文字列列は先頭の値を使う
+    """
+    freq = config.ROLLUP_FREQ
+    if not freq or df.empty:
+        return df
+
+    cutoff = df[date_col].max() - pd.Timedelta(days=config.ROLLUP_AFTER_DAYS)
+    old = df[df[date_col] < cutoff]
+    if old.empty:
+        return df
+    recent = df[df[date_col] >= cutoff]
+
+    agg = {}
+    for col in df.columns:
+        if col == date_col:
+            continue
+        if col in sum_cols:
+            agg[col] = 'sum'
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            agg[col] = 'mean'
+        else:
+            agg[col] = 'first'
+
+    period = old[date_col].dt.to_period(freq)
+    rolled = old.groupby(period).agg(agg)
+    label = '%Y-%m-%d週' if freq == 'W' else '%Y-%m月'
+    rolled.insert(0, date_col, rolled.index.start_time.strftime(label))
+    mean_cols = [col for col, how in agg.items() if how == 'mean']
+    rolled[mean_cols] = rolled[mean_cols].round(2)
+
+    recent = recent.astype({date_col: object})
+    return pd.concat([rolled.reset_index(drop=True), recent], ignore_index=True)
+
+
+def _estimated(label, df, metric):
+    """GA4の多次元キューブから足し合わせた非加算指標は見出しに（概算）を付ける"""
+    return f'{label}(概算)' if metric in df.attrs.get('non_additive', {}) else label
+
+
+def build_summary_rows(summary_data):
+    """サマリーシートの行を作成（静的エクスポートと共通）"""
+    data = [
+        ['machiyomi-fudosan.com ダッシュボード'],
+        [''],
+        ['最終更新', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+        [''],
+        ['=== 過去30日間のサマリー ==='],
+        [''],
+        ['総PV数', summary_data.get('total_pv', 0)],
+        ['総セッション数', summary_data.get('total_sessions', 0)],
+        ['ユニークユーザー数', summary_data.get('total_users', 0)],
+        ['平均セッション時間(秒)', summary_data.get('avg_session_duration', 0)],
+        [''],
+        ['=== 検索パフォーマンス ==='],
+        [''],
+        ['総クリック数', summary_data.get('total_clicks', 0)],
+        ['総表示回数', summary_data.get('total_impressions', 0)],
+        ['平均CTR(%)', summary_data.get('avg_ctr', 0)],
+        ['平均検索順位', summary_data.get('avg_position', 0)],
+        [''],
+        ['=== トップ記事 ==='],
+        [''],
+    ]
+
+    # トップ5記事を追加
+    top_articles = summary_data.get('top_articles', [])
+    for i, article in enumerate(top_articles[:5], 1):
+        data.append([f'{i}. {article["title"]}', f'{article["pv"]} PV'])
+
+    # 直近の異常値
+    anomalies = summary_data.get('anomalies', [])
+    if anomalies:
+        data.append([''])
+        data.append(['=== 異常値（直近14日） ==='])
+        data.append([''])
+        for a in anomalies[:10]:
+            direction = '急増' if a['z'] > 0 else '急減'
+            data.append([f"{a['date']} {a['metric']}{direction}", a['value'], f"z={a['z']}"])
+
+    return data
+
+
+def build_trend_frame(ga_daily, gsc_daily, trend_df=None):
+    """GA日別データとGSC日別データを日付で結合（トレンド分析シート・静的エクスポート共通）"""
+    if ga_daily.empty or gsc_daily.empty:
+        return pd.DataFrame()
+
+    ga_daily['date'] = pd.to_datetime(ga_daily['date'])
+    gsc_daily['date'] = pd.to_datetime(gsc_daily['date'])
+
+    merged = pd.merge(
+        ga_daily,
+        gsc_daily,
+        on='date',
+        how='outer'
+    ).sort_values('date')
+
+    # 速報値（未確定のGSCデータ）の行に印を付ける
+    merged['provisional'] = merged['provisional'].map({True: '速報'}).fillna('')
+
+    merged.columns = [
+        '日付', 'PV数', 'セッション数',
+        _estimated('ユーザー数', ga_daily, 'activeUsers'),
+        _estimated('平均滞在時間', ga_daily, 'averageSessionDuration'),
+        'クリック数', '表示回数', 'CTR(%)', '平均順位', '速報値'
+    ]
+    if trend_df is not None and not trend_df.empty:
+        merged = merged.merge(trend_df, on='日付', how='left')
+    return merged
+
+
+class _IndexedSpreadsheet(gspread.Spreadsheet):
+    """開くときに取得したメタデータを残す Spreadsheet（SheetIndex が同じ内容を取り直さないため）"""
+
+    def fetch_sheet_metadata(self, params=None):
+        metadata = super().fetch_sheet_metadata(params)
+        if params is None and not hasattr(self, 'opened_metadata'):
+            self.opened_metadata = metadata
+        return metadata
+
+
+class SheetIndex:
+    """スプレッドシートのメタデータ（シートID・タイトル・グリッドサイズ・グラフ・条件付き書式）
+
+    実行ごとに1回だけ取得し、シートの追加・サイズ変更・グラフ作成はローカルで反映する。
+    worksheet は index の properties をそのまま参照するため、サイズ変更は自動で反映される
+    """
+
+    def __init__(self, spreadsheet, metadata=None):
+        self.spreadsheet = spreadsheet
+        self._metadata = metadata
+        self._worksheets = {}
+        if metadata is not None:
+            metadata.setdefault('sheets', [])
+
+    @classmethod
+    def open(cls, client, key):
+        """スプレッドシートを開き、開くときに取得したメタデータから index を作成（取得は1回だけ）"""
+        spreadsheet = _IndexedSpreadsheet(client.http_client, {'id': key})
+        return cls(spreadsheet, spreadsheet.opened_metadata)
+
+    def metadata(self):
+        """スプレッドシートのメタデータ（open で作成した場合は開いたときの内容、それ以外は初回のみ取得）"""
+        if self._metadata is None:
+            self._metadata = self.spreadsheet.fetch_sheet_metadata()
+            self._metadata.setdefault('sheets', [])
+            self._worksheets = {}
+        return self._metadata
+
+    def _sheet(self, title):
+        return next((s for s in self.metadata()['sheets'] if s['properties']['title'] == title), None)
+
+    def sheet_by_id(self, sheet_id):
+        """シートID → メタデータの sheets 要素（なければ None）"""
+        return next((s for s in self.metadata()['sheets'] if s['properties']['sheetId'] == sheet_id), None)
+
+    def worksheet(self, title):
+        """シート名 → worksheet（なければ None）"""
+        sheet = self._sheet(title)
+        if sheet is None:
+            return None
+        worksheet = self._worksheets.get(title)
+        if worksheet is None:
+            worksheet = self._worksheets[title] = gspread.Worksheet(
+                self.spreadsheet.id, self.spreadsheet.client, sheet['properties']
+            )
+        return worksheet
+
+    def worksheets(self):
+        """シート名 → worksheet"""
+        return {s['properties']['title']: self.worksheet(s['properties']['title'])
+                for s in self.metadata()['sheets']}
+
+    def add_worksheet(self, title, rows, cols):
+        """シートを作成して index に追加"""
+        worksheet = self.spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+        self.metadata()['sheets'].append({'properties': worksheet._properties})
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def chart(self, title, chart_title):
+        """シート上のタイトルが chart_title のグラフ（なければ None）"""
+        sheet = self._sheet(title) or {}
+        return next((c for c in sheet.get('charts', []) if c.get('spec', {}).get('title') == chart_title), None)
+
+    def chart_extent(self, title):
+        """シート上の既存グラフのアンカーを含むのに必要な (行数, 列数)（グラフがなければ (0, 0)）"""
+        sheet = self._sheet(title) or {}
+        rows = cols = 0
+        for chart in sheet.get('charts', []):
+            anchor = chart.get('position', {}).get('overlayPosition', {}).get('anchorCell', {})
+            rows = max(rows, anchor.get('rowIndex', 0) + 1)
+            cols = max(cols, anchor.get('columnIndex', 0) + 1)
+        return rows, cols
+
+    def add_charts(self, replies):
+        """batch_update の返信から作成したグラフを index に追加"""
+        for reply in replies:
+            chart = reply.get('addChart', {}).get('chart')
+            if chart is None:
+                continue
+            sheet = self.sheet_by_id(chart['position']['overlayPosition']['anchorCell']['sheetId'])
+            if sheet is not None:
+                sheet.setdefault('charts', []).append(chart)
+
+    def developer_metadata(self, key):
+        """スプレッドシートのデベロッパーメタデータ（なければ None）"""
+        return next((m for m in self.metadata().get('developerMetadata', []) if m['metadataKey'] == key), None)
+
+    def set_developer_metadata(self, metadata):
+        entries = [m for m in self.metadata().get('developerMetadata', [])
+                   if m['metadataKey'] != metadata['metadataKey']]
+        self._metadata['developerMetadata'] = entries + [metadata]
+
+
 class SheetsClient:
     def __init__(self):
         self.client = get_sheets_client()
-        self.spreadsheet = self.client.open_by_key(config.SPREADSHEET_ID)
-
-    def _get_or_create_sheet(self, sheet_name):
-        """シートを取得、なければ作成"""
-        try:
-            worksheet = self.spreadsheet.worksheet(sheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = self.spreadsheet.add_worksheet(
-                title=sheet_name,
-                rows=1000,
-                cols=26
-            )
+        # シート構成は開くときの1回だけ取得して charts・sync_articles と共有する
+        self.index = SheetIndex.open(self.client, config.SPREADSHEET_ID)
+        self.spreadsheet = self.index.spreadsheet
+        # 書き込んだシート {シート名: (worksheet, 見出し)}（書式適用用）
+        self._written = {}
+
+    def _get_or_create_sheet(self, sheet_name, rows=1, cols=1):
+        """シートを取得、なければ書き込むデータと同じサイズで作成"""
+        worksheet = self.index.worksheet(sheet_name)
+        if worksheet is None:
+            worksheet = self.index.add_worksheet(sheet_name, rows, cols)
         return worksheet
 
-    def _clear_and_write(self, sheet_name, df, include_header=True):
-        """シートをクリアしてDataFrameを書き込み"""
-        worksheet = self._get_or_create_sheet(sheet_name)
-        worksheet.clear()
+    def _resize_requests(self, worksheet, rows, cols):
+        """シートのグリッドを rows×cols にするリクエストを作成
+
+        行を増やす場合は直前のデータ行の書式を引き継ぐ（見出し行だけの場合は引き継がない）
+        グリッドサイズの worksheet への反映は、送信が成功した後に呼び出し側で行う
+        """
+        requests = []
+        for dimension, current, target in [
+            ('ROWS', worksheet.row_count, rows),
+            ('COLUMNS', worksheet.col_count, cols),
+        ]:
+            dim_range = {'sheetId': worksheet.id, 'dimension': dimension}
+            if target > current:
+                requests.append({'insertDimension': {
+                    'range': dict(dim_range, startIndex=current, endIndex=target),
+                    'inheritFromBefore': dimension == 'ROWS' and current > 1
+                }})
+            elif target < current:
+                requests.append({'deleteDimension': {
+                    'range': dict(dim_range, startIndex=target, endIndex=current)
+                }})
+        return requests
+
+    def _write_rows(self, sheet_name, data, headers=None):
+        """2次元リストをシートに書き込み（サマリーなど小さい表用）"""
+        cols = max(len(row) for row in data)
+        rows = [
+            {'values': [_cell_data(v) for v in row] + [{}] * (cols - len(row))}
+            for row in data
+        ]
+        return self._write_cells(sheet_name, [rows], len(rows), cols, headers)
+
+    def _write_cells(self, sheet_name, chunks, rows, cols, headers=None):
+        """シートを書き込むデータと同じサイズにしてCellDataの行を書き込み
+
+        chunks: 上から順に並んだ行（{'values': [CellData, ...]}）のリストのイテラブル
+        WRITE_CHUNK_ROWS 行未満は1回のbatch_update（サイズ変更も同じリクエスト）で書き込み、
+        それより大きい表は WRITE_CHUNK_ROWS 行ごとに送信してリクエストとメモリを小さく保つ
+        空セルもセル数上限にカウントされるため、余分な行・列は残さない
+        headers を渡した表形式のシートは apply_formats で列ごとの書式を設定する
+        """
+        worksheet = self._get_or_create_sheet(sheet_name, rows, cols)
+
+        # 固定行・列はすべて削除できないため、その分は確保する
+        # グラフのアンカーセルもグリッド内に残す（削除するとグラフの位置が失われる）
+        grid = worksheet._properties['gridProperties']
+        chart_rows, chart_cols = self.index.chart_extent(sheet_name)
+        grid_rows = max(rows, grid.get('frozenRowCount', 0) + 1, chart_rows)
+        cols = max(cols, grid.get('frozenColumnCount', 0) + 1, chart_cols)
+
+        requests = self._resize_requests(worksheet, grid_rows, cols)
+        pending = 0
+        start = 0
+        for chunk in chunks:
+            requests.append(_update_cells_request(worksheet.id, start, cols, chunk))
+            pending += len(chunk)
+            start += len(chunk)
+            if pending >= WRITE_CHUNK_ROWS:
+                self.spreadsheet.batch_update({'requests': requests})
+                grid.update(rowCount=grid_rows, columnCount=cols)
+                requests, pending = [], 0
+
+        if start < grid_rows:
+            blank = [{'values': [{}] * cols}] * (grid_rows - start)
+            requests.append(_update_cells_request(worksheet.id, start, cols, blank))
+        if requests:
+            self.spreadsheet.batch_update({'requests': requests})
+        grid.update(rowCount=grid_rows, columnCount=cols)
+
+        self._written[sheet_name] = (worksheet, headers)
+        return worksheet
 
+    def _clear_and_write(self, sheet_name, df, include_header=True):
+        """シートをクリアしてDataFrameを書き込み（列ごとに変換し、大きい表はチャンクに分けて送信）"""
         if df.empty:
-            worksheet.update('A1', [['データがありません']])
-            return worksheet
+            return self._write_rows(sheet_name, [['データがありません']])
 
-        # DataFrameを2次元リストに変換
+        chunks = iter_frame_cells(df, WRITE_CHUNK_ROWS)
+        headers = None
+        rows = len(df)
         if include_header:
-            data = [df.columns.tolist()] + df.values.tolist()
+            headers = [str(c) for c in df.columns]
+            header_row = {'values': [_cell_data(h) for h in headers]}
+            chunks = itertools.chain([[header_row]], chunks)
+            rows += 1
+
+        return self._write_cells(sheet_name, chunks, rows, len(df.columns), headers=headers)
+
+    def written_sheets(self):
+        """この実行で書き込んだシートの見出し {シート名: 見出し}（実行の再開用）"""
+        return {name: headers for name, (_, headers) in self._written.items()}
+
+    def restore_written(self, written):
+        """前回の実行で書き込み済みのシートを書式適用の対象に戻す"""
+        if not written:
+            return
+        worksheets = self.index.worksheets()
+        for name, headers in written.items():
+            if name in worksheets:
+                self._written[name] = (worksheets[name], headers)
+
+    def _compile_format_requests(self, worksheet, headers):
+        """シートの書式をbatch_update用リクエストにまとめる"""
+        if not headers:
+            return format_cell_ranges(worksheet, [('A1', sheet_formats.TITLE_FORMAT)])
+
+        requests = []
+        ranges = [(f'A1:{rowcol_to_a1(1, len(headers))}', sheet_formats.HEADER_FORMAT)]
+        for i, header in enumerate(headers, 1):
+            col = rowcol_to_a1(1, i)[:-1]
+            if header in sheet_formats.COLUMN_FORMATS:
+                ranges.append((f'{col}2:{col}', sheet_formats.COLUMN_FORMATS[header]))
+            if header in sheet_formats.GRADIENT_COLUMNS:
+                rule = ConditionalFormatRule(
+                    ranges=[{'sheetId': worksheet.id, 'startRowIndex': 1,
+                             'startColumnIndex': i - 1, 'endColumnIndex': i}],
+                    gradientRule=sheet_formats.GRADIENT_COLUMNS[header]
+                )
+                requests.append({'addConditionalFormatRule': {'rule': rule.to_props(), 'index': 0}})
+
+        requests += format_cell_ranges(worksheet, ranges)
+        requests += set_frozen(worksheet, rows=sheet_formats.FROZEN_HEADER_ROWS)
+        return requests
+
+    def apply_formats(self):
+        """書き込んだシートの書式を1回のbatch_updateで適用
+
+        シートごとの書式リクエストのハッシュと、追加した条件付き書式（種類・範囲）を
+        デベロッパーメタデータに保存し、書式・見出し・シートIDが変わったシートと、
+        追加した条件付き書式が手動で消されたシートだけ適用する。変更がなければAPI呼び出しなし
+        付け直す際に削除するのはこの処理で追加した条件付き書式だけ（手動で追加したものは残す）
+        """
+        compiled = {}
+        entries = {}
+        for worksheet, headers in self._written.values():
+            key = str(worksheet.id)
+            compiled[key] = self._compile_format_requests(worksheet, headers)
+            entries[key] = {
+                'hash': hashlib.sha256(
+                    json.dumps(compiled[key], sort_keys=True, ensure_ascii=False).encode('utf-8')
+                ).hexdigest(),
+                'rules': [_rule_signature(r['addConditionalFormatRule']['rule'])
+                          for r in compiled[key] if 'addConditionalFormatRule' in r],
+            }
+
+        current = self.index.developer_metadata(FORMAT_HASH_KEY)
+        applied = json.loads(current['metadataValue']) if current else {}
+        changed = {}
+        for key, entry in entries.items():
+            previous = applied.get(key)
+            # 旧形式（ハッシュのみ）の場合は、以前は全ルールを置き換えていたため今回と同じ範囲のルールを追加済みとみなす
+            recorded = previous['rules'] if isinstance(previous, dict) else entry['rules']
+            sheet = self.index.sheet_by_id(int(key)) or {}
+            existing = [_rule_signature(r) for r in sheet.get('conditionalFormats', [])]
+            if (not isinstance(previous, dict) or previous['hash'] != entry['hash']
+                    or any(sig not in existing for sig in recorded)):
+                changed[key] = (recorded, existing)
+        applied.update(entries)
+        if not changed:
+            return False
+
+        # 付け直すシートでは、前回この処理で追加した条件付き書式だけを先に削除する
+        requests = []
+        kept = {}
+        for key, (recorded, existing) in changed.items():
+            remaining = list(recorded)
+            kept[key] = []
+            rules = (self.index.sheet_by_id(int(key)) or {}).get('conditionalFormats', [])
+            for index in reversed(range(len(existing))):
+                if existing[index] in remaining:
+                    remaining.remove(existing[index])
+                    requests.append({'deleteConditionalFormatRule': {'sheetId': int(key), 'index': index}})
+                else:
+                    kept[key].insert(0, rules[index])
+        for key in changed:
+            requests += compiled[key]
+
+        value = json.dumps(applied, sort_keys=True)
+        if current:
+            requests.append({'updateDeveloperMetadata': {
+                'dataFilters': [{'developerMetadataLookup': {'metadataId': current['metadataId']}}],
+                'developerMetadata': {'metadataValue': value},
+                'fields': 'metadataValue'
+            }})
         else:
-            data = df.values.tolist()
-
-        # 日付型を文字列に変換
-        for i, row in enumerate(data):
-            for j, cell in enumerate(row):
-                if isinstance(cell, (datetime, pd.Timestamp)):
-                    data[i][j] = cell.strftime('%Y-%m-%d')
-                elif pd.isna(cell):
-                    data[i][j] = ''
-
-        worksheet.update('A1', data)
-        return worksheet
+            requests.append({'createDeveloperMetadata': {'developerMetadata': {
+                'metadataKey': FORMAT_HASH_KEY,
+                'metadataValue': value,
+                'location': {'spreadsheet': True},
+                'visibility': 'DOCUMENT'
+            }}})
+
+        response = self.spreadsheet.batch_update({'requests': requests})
+
+        # 同じ実行で再度適用する場合に備えて index にも反映（メタデータは取り直さない）
+        # 追加したルールは index 0 に順に挿入されるため、手動のルールより前に逆順で並ぶ
+        for key in changed:
+            sheet = self.index.sheet_by_id(int(key))
+            if sheet is not None:
+                added = [r['addConditionalFormatRule']['rule'] for r in compiled[key]
+                         if 'addConditionalFormatRule' in r]
+                sheet['conditionalFormats'] = added[::-1] + kept[key]
+        if current:
+            self.index.set_developer_metadata(dict(current, metadataValue=value))
+        else:
+            reply = (response.get('replies') or [{}])[-1].get('createDeveloperMetadata', {})
+            if 'developerMetadata' in reply:
+                self.index.set_developer_metadata(reply['developerMetadata'])
+        return True
+
+    def get_cell_budget(self):
+        """シートごとのセル数とスプレッドシート全体の使用率を取得（index のグリッドサイズから集計）"""
+        metadata = self.index.metadata()
+        budget = []
+        for sheet in metadata['sheets']:
+            grid = sheet['properties'].get('gridProperties', {})
+            rows = grid.get('rowCount', 0)
+            cols = grid.get('columnCount', 0)
+            budget.append({
+                'sheet': sheet['properties']['title'],
+                'rows': rows,
+                'cols': cols,
+                'cells': rows * cols
+            })
+
+        df = pd.DataFrame(budget, columns=['sheet', 'rows', 'cols', 'cells'])
+        if not df.empty:
+            df = df.sort_values('cells', ascending=False)
+            df['usage(%)'] = (df['cells'] / CELL_LIMIT * 100).round(2)
+        return df
 
     def write_summary(self, summary_data):
         """サマリーシートを更新"""
         sheet_name = config.SHEETS['summary']
-        worksheet = self._get_or_create_sheet(sheet_name)
-        worksheet.clear()
-
-        # サマリーデータを書き込み
-        data = [
-            ['machiyomi-fudosan.com ダッシュボード'],
-            [''],
-            ['最終更新', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            [''],
-            ['=== 過去30日間のサマリー ==='],
-            [''],
-            ['総PV数', summary_data.get('total_pv', 0)],
-            ['総セッション数', summary_data.get('total_sessions', 0)],
-            ['ユニークユーザー数', summary_data.get('total_users', 0)],
-            ['平均セッション時間(秒)', summary_data.get('avg_session_duration', 0)],
-            [''],
-            ['=== 検索パフォーマンス ==='],
-            [''],
-            ['総クリック数', summary_data.get('total_clicks', 0)],
-            ['総表示回数', summary_data.get('total_impressions', 0)],
-            ['平均CTR(%)', summary_data.get('avg_ctr', 0)],
-            ['平均検索順位', summary_data.get('avg_position', 0)],
-            [''],
-            ['=== トップ記事 ==='],
-            [''],
-        ]
-
-        # トップ5記事を追加
-        top_articles = summary_data.get('top_articles', [])
-        for i, article in enumerate(top_articles[:5], 1):
-            data.append([f'{i}. {article["title"]}', f'{article["pv"]} PV'])
-
-        worksheet.update('A1', data)
-        return worksheet
+        return self._write_rows(sheet_name, build_summary_rows(summary_data))
 
     def write_daily_pv(self, df):
         """日別PVシートを更新"""
@@ -97,7 +619,11 @@ class SheetsClient:
 
         # カラム名を日本語に
         df_display = df.copy()
-        df_display.columns = ['日付', 'PV数', 'セッション数', 'ユーザー数', '平均滞在時間(秒)']
+        users = _estimated('ユーザー数', df, 'activeUsers')
+        df_display.columns = [
+            '日付', 'PV数', 'セッション数', users, _estimated('平均滞在時間(秒)', df, 'averageSessionDuration')
+        ]
+        df_display = _rollup_daily(df_display, '日付', ['PV数', 'セッション数', users])
 
         worksheet = self._clear_and_write(sheet_name, df_display)
         return worksheet
@@ -122,72 +648,75 @@ class SheetsClient:
         worksheet = self._clear_and_write(sheet_name, df_display)
         return worksheet
 
-    def write_trends(self, ga_daily, gsc_daily):
-        """トレンド分析シートを更新（GA + GSC統合）"""
-        sheet_name = config.SHEETS['trends']
-        worksheet = self._get_or_create_sheet(sheet_name)
-        worksheet.clear()
-
-        # GA日別データとGSC日別データをマージ
-        if not ga_daily.empty and not gsc_daily.empty:
-            ga_daily['date'] = pd.to_datetime(ga_daily['date'])
-            gsc_daily['date'] = pd.to_datetime(gsc_daily['date'])
-
-            merged = pd.merge(
-                ga_daily,
-                gsc_daily,
-                on='date',
-                how='outer'
-            ).sort_values('date')
-
-            merged.columns = [
-                '日付', 'PV数', 'セッション数', 'ユーザー数', '平均滞在時間',
-                'クリック数', '表示回数', 'CTR(%)', '平均順位'
-            ]
+    def write_article_join(self, df):
+        """記事統合シートを更新（WordPress + GA4 + GSC を記事単位で結合済み）"""
+        sheet_name = config.SHEETS['article_join']
+        return self._clear_and_write(sheet_name, df)
 
-            self._clear_and_write(sheet_name, merged)
+    def write_link_graph(self, df):
+        """内部リンク分析シートを更新"""
+        sheet_name = config.SHEETS['link_graph']
+        return self._clear_and_write(sheet_name, df)
 
-        return worksheet
+    def write_cannibalization(self, df):
+        """キーワード競合シートを更新"""
+        sheet_name = config.SHEETS['cannibalization']
+        return self._clear_and_write(sheet_name, df)
+
+    def write_query_clusters(self, df):
+        """クエリクラスタシートを更新"""
+        sheet_name = config.SHEETS['query_clusters']
+        return self._clear_and_write(sheet_name, df)
+
+    def write_trends(self, ga_daily, gsc_daily, trend_df=None):
+        """トレンド分析シートを更新（GA + GSC統合）
+
+        trend_df（trend_engine.trend_columns の結果）があれば移動合計・前週比などの列を追加
+        """
+        sheet_name = config.SHEETS['trends']
+        merged = build_trend_frame(ga_daily, gsc_daily, trend_df)
+        if not merged.empty:
+            merged = _rollup_daily(
+                merged, '日付',
+                ['PV数', 'セッション数', _estimated('ユーザー数', ga_daily, 'activeUsers'), 'クリック数', '表示回数']
+            )
+        return self._clear_and_write(sheet_name, merged)
 
     def write_time_analysis(self, hourly_df, dayofweek_df):
         """曜日・時間帯分析シートを更新"""
         sheet_name = config.SHEETS['time_analysis']
-        worksheet = self._get_or_create_sheet(sheet_name)
-        worksheet.clear()
 
         data = [
             ['曜日・時間帯分析'],
             ['最終更新', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
             [''],
             ['=== 時間帯別アクセス（0-23時） ==='],
-            ['時間', 'PV数', 'セッション数', 'ユーザー数'],
+            ['時間', 'PV数', _estimated('セッション数', hourly_df, 'sessions'),
+             _estimated('ユーザー数', hourly_df, 'activeUsers')],
         ]
 
         # 時間帯別データ
         if not hourly_df.empty:
-            for _, row in hourly_df.iterrows():
-                data.append([
-                    f"{int(row['hour'])}時",
-                    int(row['screenPageViews']),
-                    int(row['sessions']),
-                    int(row['activeUsers'])
-                ])
+            data += [
+                [f"{hour}時", pv, sessions, users]
+                for hour, pv, sessions, users in zip(*_int_columns(
+                    hourly_df, ['hour', 'screenPageViews', 'sessions', 'activeUsers']
+                ))
+            ]
 
         data.append([''])
         data.append(['=== 曜日別アクセス ==='])
-        data.append(['曜日', 'PV数', 'セッション数', 'ユーザー数'])
+        data.append(['曜日', 'PV数', 'セッション数', _estimated('ユーザー数', dayofweek_df, 'activeUsers')])
 
         # 曜日別データ
         day_names = ['日曜', '月曜', '火曜', '水曜', '木曜', '金曜', '土曜']
         if not dayofweek_df.empty:
-            for _, row in dayofweek_df.iterrows():
-                day_idx = int(row['dayOfWeek'])
-                data.append([
-                    day_names[day_idx],
-                    int(row['screenPageViews']),
-                    int(row['sessions']),
-                    int(row['activeUsers'])
-                ])
+            data += [
+                [day_names[day], pv, sessions, users]
+                for day, pv, sessions, users in zip(*_int_columns(
+                    dayofweek_df, ['dayOfWeek', 'screenPageViews', 'sessions', 'activeUsers']
+                ))
+            ]
 
         # ベスト投稿タイミング分析
         data.append([''])
@@ -201,5 +730,4 @@ class SheetsClient:
             best_day = dayofweek_df.loc[dayofweek_df['screenPageViews'].idxmax()]
             data.append(['最もアクセスが多い曜日', day_names[int(best_day['dayOfWeek'])]])
 
-        worksheet.update('A1', data)
-        return worksheet
+        return self._write_rows(sheet_name, data)
@@ -0,0 +1,239 @@
+"""
+Static Dashboard Export
+ダッシュボードのデータをビューごとのgzip圧縮JSONと静的HTMLに書き出す
+（閲覧時にGoogle APIを使わない。配信は serve_dashboard.py）
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import config
+
+DATA_SUBDIR = 'data'
+MANIFEST_FILE = 'manifest.json'
+
+DAY_NAMES = ['日曜', '月曜', '火曜', '水曜', '木曜', '金曜', '土曜']
+
+ARTICLE_COLUMNS = {
+    'pagePath': 'URL', 'pageTitle': '記事タイトル', 'screenPageViews': 'PV数',
+    'averageSessionDuration': '平均滞在時間(秒)', 'bounceRate': '直帰率(%)',
+}
+QUERY_COLUMNS = {
+    'query': '検索クエリ', 'clicks': 'クリック数', 'impressions': '表示回数',
+    'ctr': 'CTR(%)', 'position': '平均順位',
+}
+TIME_COLUMNS = {
+    'hour': '時間', 'dayOfWeek': '曜日', 'screenPageViews': 'PV数',
+    'sessions': 'セッション数', 'activeUsers': 'ユーザー数',
+}
+
+
+def _time_columns(df):
+    """時間帯・曜日別の見出し（多次元キューブから足し合わせた非加算指標は（概算）を付ける）"""
+    estimated = df.attrs.get('non_additive', {})
+    return {k: f'{v}(概算)' if k in estimated else v for k, v in TIME_COLUMNS.items()}
+
+
+def table_payload(df):
+    """DataFrameを {columns, rows} に変換（日付は文字列、欠損は null）"""
+    if df is None or df.empty:
+        return {'columns': [], 'rows': []}
+
+    df = df.copy()
+    for col in df.columns:
+        dtype = df[col].dtype
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+        elif dtype == np.float32:
+            # float32は10進の桁に戻す（3.3 が 3.2999999523 にならないように）
+            df[col] = df[col].astype(str).astype('float64')
+        elif isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+
+    rows = df.astype(object).where(df.notna(), None).values.tolist()
+    return {'columns': [str(c) for c in df.columns], 'rows': rows}
+
+
+def build_views(summary_rows, trend_frame, article_perf, queries, hourly_df, dayofweek_df, extra_tables=None):
+    """ビュー名 → ペイロード（タイトル・表）を作成
+
+    extra_tables: {ビュー名: (タイトル, DataFrame)}（クエリクラスタなど、あれば追加）
+    """
+    dayofweek = dayofweek_df.copy()
+    if not dayofweek.empty:
+        dayofweek['dayOfWeek'] = [DAY_NAMES[int(d)] for d in dayofweek['dayOfWeek']]
+
+    views = {
+        'summary': {'title': 'サマリー', 'items': summary_rows, 'tables': {}},
+        'daily': {'title': '日別トレンド', 'tables': {'日別': table_payload(trend_frame)}},
+        'articles': {'title': 'トップ記事', 'tables': {
+            '記事別': table_payload(article_perf.rename(columns=ARTICLE_COLUMNS))
+        }},
+        'queries': {'title': '検索クエリ', 'tables': {
+            '検索クエリ': table_payload(queries.rename(columns=QUERY_COLUMNS))
+        }},
+        'time': {'title': '時間帯分析', 'tables': {
+            '時間帯別': table_payload(hourly_df.rename(columns=_time_columns(hourly_df))),
+            '曜日別': table_payload(dayofweek.rename(columns=_time_columns(dayofweek))),
+        }},
+    }
+    for name, (title, df) in (extra_tables or {}).items():
+        if df is not None:
+            views[name] = {'title': title, 'tables': {title: table_payload(df)}}
+    return views
+
+
+def _write_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def export_dashboard(views, out_dir=None):
+    """ビューごとに data/<ビュー名>.json.gz と manifest.json・index.html を書き出す
+
+    gzipのmtimeを固定しているため、内容が同じなら同じバイト列（同じETag）になる。
+    manifest.json の hash をURLに付けて読み込むことで、ブラウザは変更のあったビューだけ再取得する
+    """
+    out_dir = out_dir or config.EXPORT_DIR
+    data_dir = os.path.join(out_dir, DATA_SUBDIR)
+    os.makedirs(data_dir, exist_ok=True)
+
+    generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    manifest = {'generated_at': generated_at, 'views': {}}
+    for name, view in views.items():
+        body = json.dumps(view, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        _write_atomic(os.path.join(data_dir, f'{name}.json.gz'), compressed)
+        manifest['views'][name] = {
+            'title': view['title'],
+            'hash': hashlib.sha256(body).hexdigest()[:16],
+            'bytes': len(body),
+            'gzip_bytes': len(compressed),
+            'rows': sum(len(t['rows']) for t in view['tables'].values()),
+        }
+
+    # 今回書き出さなかった古いビューは削除
+    for filename in os.listdir(data_dir):
+        if filename.endswith('.json.gz') and filename[:-len('.json.gz')] not in views:
+            os.remove(os.path.join(data_dir, filename))
+
+    _write_atomic(
+        os.path.join(out_dir, MANIFEST_FILE),
+        json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8')
+    )
+    _write_atomic(os.path.join(out_dir, 'index.html'), INDEX_HTML.encode('utf-8'))
+    return manifest
+
+
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>machiyomi-fudosan.com ダッシュボード</title>
+<style>
+body { font-family: sans-serif; margin: 0; color: #222; }
+header { background: #4285f4; color: #fff; padding: 12px 20px; }
+header small { opacity: .8; margin-left: 12px; }
+nav { padding: 8px 20px; border-bottom: 1px solid #ddd; }
+nav button { margin: 2px; padding: 6px 12px; border: 1px solid #ccc; background: #fff; cursor: pointer; }
+nav button.active { background: #4285f4; color: #fff; border-color: #4285f4; }
+main { padding: 12px 20px; }
+table { border-collapse: collapse; font-size: 13px; margin-bottom: 16px; }
+th { background: #4285f4; color: #fff; position: sticky; top: 0; }
+th, td { border: 1px solid #ddd; padding: 4px 8px; }
+td.num { text-align: right; }
+.more { margin-bottom: 24px; }
+</style>
+</head>
+<body>
+<header><b>machiyomi-fudosan.com ダッシュボード</b><small id="generated"></small></header>
+<nav id="nav"></nav>
+<main id="main"></main>
+<script>
+const PAGE_ROWS = 500;
+let manifest = null;
+const cache = {};
+
+function el(tag, text, cls) {
+  const e = document.createElement(tag);
+  if (text !== undefined && text !== null) e.textContent = text;
+  if (cls) e.className = cls;
+  return e;
+}
+
+function renderTable(parent, name, table) {
+  parent.appendChild(el('h3', name + '（' + table.rows.length.toLocaleString() + '行）'));
+  const t = el('table');
+  const head = el('tr');
+  table.columns.forEach(c => head.appendChild(el('th', c)));
+  t.appendChild(head);
+  parent.appendChild(t);
+  let shown = 0;
+  const more = el('button', 'さらに表示', 'more');
+  function page() {
+    const end = Math.min(shown + PAGE_ROWS, table.rows.length);
+    const frag = document.createDocumentFragment();
+    for (let i = shown; i < end; i++) {
+      const tr = el('tr');
+      table.rows[i].forEach(v => tr.appendChild(
+        el('td', typeof v === 'number' ? v.toLocaleString() : v, typeof v === 'number' ? 'num' : '')));
+      frag.appendChild(tr);
+    }
+    t.appendChild(frag);
+    shown = end;
+    more.style.display = shown < table.rows.length ? '' : 'none';
+  }
+  more.onclick = page;
+  parent.appendChild(more);
+  page();
+}
+
+async function show(name) {
+  document.querySelectorAll('nav button').forEach(b => b.classList.toggle('active', b.dataset.view === name));
+  const info = manifest.views[name];
+  if (!cache[name]) {
+    const res = await fetch('data/' + name + '.json?v=' + info.hash);
+    cache[name] = await res.json();
+  }
+  const view = cache[name];
+  const main = document.getElementById('main');
+  main.replaceChildren();
+  if (view.items) {
+    const t = el('table');
+    view.items.forEach(row => {
+      const tr = el('tr');
+      row.forEach(v => tr.appendChild(el('td', typeof v === 'number' ? v.toLocaleString() : v)));
+      t.appendChild(tr);
+    });
+    main.appendChild(t);
+  }
+  Object.entries(view.tables).forEach(([n, table]) => renderTable(main, n, table));
+  location.hash = name;
+}
+
+async function init() {
+  manifest = await (await fetch('manifest.json', {cache: 'no-cache'})).json();
+  document.getElementById('generated').textContent = '最終更新 ' + manifest.generated_at;
+  const nav = document.getElementById('nav');
+  Object.entries(manifest.views).forEach(([name, info]) => {
+    const b = el('button', info.title);
+    b.dataset.view = name;
+    b.onclick = () => show(name);
+    nav.appendChild(b);
+  });
+  const first = location.hash.slice(1);
+  show(manifest.views[first] ? first : Object.keys(manifest.views)[0]);
+}
+
+init();
+</script>
+</body>
+</html>
+"""
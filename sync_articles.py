@@ -3,11 +3,47 @@ WordPress記事一覧をスプレッドシートに同期
 WordPress REST APIを使用（SSH不要）
 """
 
+import argparse
+import hashlib
+import json
 import requests
 import re
-from datetime import datetime
-import config
-from auth import get_sheets_client
+import gspread
+import pandas as pd
+from gspread.utils import absolute_range_name
+import local_store
+from article_join import normalize_paths
+import response_cache
+from link_graph import analyze_links
+from run_profiler import Profiler
+from sheets_client import SheetsClient
+
+SHEET_NAME = '記事一覧'
+
+# 15列フォーマット（M列 メタディ・O列 推奨リンク は手動編集用）
+HEADER = ['ID', 'No,', 'タイトル', 'ステータス', 'リンク', '日付', 'カテゴリ', 'タグ', '内', '外', 'アイ', '画', 'メタディ', 'スラッグ', '推奨リンク']
+
+# 記事一覧のスナップショット（local_query.py で問い合わせ）
+ARTICLES_TABLE = 'articles'
+SNAPSHOT_COLUMNS = ['ID', 'タイトル', 'リンク', '日付', 'カテゴリ', 'スラッグ', '内', '外', '画']
+
+# 行ごとの書き込み済みハッシュ（変更検出用）
+ROW_STATE = 'article_rows'
+UNPUBLISHED = '非公開'
+
+
+def _wp_get(url, params):
+    """WordPress REST APIのGET（レスポンスキャッシュ経由）
+
+    {'json': 本文, 'total_pages': X-WP-TotalPages} を返す。取得失敗時は None（キャッシュしない）
+    """
+    def fetch():
+        response = requests.get(url, params=params)
+        if response.status_code != 200:
+            return None
+        return {'json': response.json(), 'total_pages': int(response.headers.get('X-WP-TotalPages', 1))}
+
+    return response_cache.cached('wordpress', {'url': url, 'params': params}, fetch)
 
 
 def get_wordpress_articles():
@@ -23,12 +59,12 @@ def get_wordpress_articles():
             'status': 'publish',
             '_fields': 'id,title,date,link,slug,content,categories'
         }
-        response = requests.get(base_url, params=params)
+        response = _wp_get(base_url, params)
 
-        if response.status_code != 200:
+        if response is None:
             break
 
-        posts = response.json()
+        posts = response['json']
         if not posts:
             break
 
@@ -36,8 +72,7 @@ def get_wordpress_articles():
         page += 1
 
         # 全ページ取得したか確認
-        total_pages = int(response.headers.get('X-WP-TotalPages', 1))
-        if page > total_pages:
+        if page > response['total_pages']:
             break
 
     return all_posts
@@ -47,10 +82,10 @@ def get_categories():
     """カテゴリID→名前のマッピングを取得"""
     url = "https://machiyomi-fudosan.com/wp-json/wp/v2/categories"
     params = {'per_page': 100}
-    response = requests.get(url, params=params)
+    response = _wp_get(url, params)
 
-    if response.status_code == 200:
-        return {cat['id']: cat['name'] for cat in response.json()}
+    if response is not None:
+        return {cat['id']: cat['name'] for cat in response['json']}
     return {}
 
 
@@ -63,15 +98,8 @@ def count_links(content):
     return internal, external, images
 
 
-def sync_articles():
-    """記事一覧シートを更新"""
-    print("[記事同期] WordPress REST APIから記事取得中...")
-    posts = get_wordpress_articles()
-    print(f"  → {len(posts)}件取得")
-
-    categories = get_categories()
-
-    # 記事データを整形
+def build_articles(posts, categories):
+    """記事データを整形（日付の古い順）"""
     articles = []
     for post in posts:
         content = post.get('content', {}).get('rendered', '')
@@ -98,60 +126,165 @@ def sync_articles():
 
     # 日付でソート（古い順）
     articles.sort(key=lambda x: x['日付'])
+    return articles
+
+
+def save_articles(articles):
+    """記事一覧のスナップショットをローカルに保存（local_query の articles テーブル）
+
+    GA4の pagePath・GSCの page と結合できるよう、正規化したパスとリンクを列に持つ
+    dashboard.py の記事統合でも使うため、本文から数えたリンク数（内・外・画）も保存する
+    """
+    df = pd.DataFrame(articles, columns=SNAPSHOT_COLUMNS)
+    df['pagePath'] = normalize_paths(df['リンク']).values
+    df['page'] = df['リンク']
+    local_store.write_frame(ARTICLES_TABLE, df)
+    return articles
+
+
+def load_articles():
+    """記事一覧のスナップショットを build_articles と同じ形式で読み込み
+
+    スナップショットがない（またはリンク数を保存する前の）場合だけ WordPress から全記事を取得して保存する
+    """
+    df = local_store.read_frame(ARTICLES_TABLE)
+    if df.empty or not set(SNAPSHOT_COLUMNS) <= set(df.columns):
+        print("  → 記事一覧のスナップショットがないため WordPress から取得します")
+        return save_articles(build_articles(get_wordpress_articles(), get_categories()))
+    return df[SNAPSHOT_COLUMNS].to_dict('records')
+
+
+def _row_values(art, no):
+    """自動更新する列の値を作成（A〜L列とN列。M列・O列は手動編集用なので含めない）"""
+    left = [
+        art['ID'],
+        str(no),
+        art['タイトル'],
+        art['ステータス'],
+        art['リンク'],
+        art['日付'],
+        art['カテゴリ'],
+        '(なし)',
+        art['内'],
+        art['外'],
+        art['アイ'],
+        art['画'],
+    ]
+    right = [art['スラッグ']]
+    return left, right
 
-    # スプレッドシートに書き込み
+
+def _row_runs(row_numbers):
+    """連続する行番号をまとめる [(開始行, 終了行), ...]"""
+    runs = []
+    for row in sorted(row_numbers):
+        if runs and runs[-1][1] == row - 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return runs
+
+
+def sync_articles(profiler=None):
+    """記事一覧シートを更新
+
+    ID列だけを読み込み、変更のあった記事の行と新しい記事だけを1回のバッチで書き込む。
+    メタディ（M列）・推奨リンク（O列）は手動で編集する列なので一切書き換えない。
+    """
+    profiler = profiler or Profiler('sync_articles')
+    profiler.stage('WP取得')
+    print("[記事同期] WordPress REST APIから記事取得中...")
+    posts = get_wordpress_articles()
+    print(f"  → {len(posts)}件取得")
+
+    profiler.stage('記事整形')
+    articles = save_articles(build_articles(posts, get_categories()))
+
+    profiler.stage('記事一覧書き込み')
     print("[記事同期] スプレッドシート更新中...")
-    client = get_sheets_client()
-    spreadsheet = client.open_by_key(config.SPREADSHEET_ID)
-    worksheet = spreadsheet.worksheet('記事一覧')
-
-    # 既存データを取得してメタディ・推奨リンクを保持
-    existing_data = worksheet.get_all_values()
-    existing_meta = {}
-    if len(existing_data) > 1:
-        header = existing_data[0]
-        for row in existing_data[1:]:
-            if len(row) > 14:
-                existing_meta[row[0]] = {
-                    'メタディ': row[12] if len(row) > 12 else '',
-                    '推奨リンク': row[14] if len(row) > 14 else ''
-                }
-
-    # 15列フォーマットで行を作成
-    header = ['ID', 'No,', 'タイトル', 'ステータス', 'リンク', '日付', 'カテゴリ', 'タグ', '内', '外', 'アイ', '画', 'メタディ', 'スラッグ', '推奨リンク']
-    rows = [header]
-
-    for i, art in enumerate(articles, 1):
-        # 既存のメタディ・推奨リンクを保持
-        meta = existing_meta.get(art['ID'], {'メタディ': '', '推奨リンク': ''})
-
-        row = [
-            art['ID'],
-            str(i),
-            art['タイトル'],
-            art['ステータス'],
-            art['リンク'],
-            art['日付'],
-            art['カテゴリ'],
-            '(なし)',
-            art['内'],
-            art['外'],
-            art['アイ'],
-            art['画'],
-            meta['メタディ'],
-            art['スラッグ'],
-            meta['推奨リンク']
-        ]
-        rows.append(row)
-
-    # シートを更新（記事一覧シートのみ）
-    worksheet.clear()
-    worksheet.update('A1', rows, value_input_option='RAW')
-
-    print(f"✅ 記事一覧を更新しました（{len(articles)}件）")
-    print(f"   最古: {articles[0]['日付'][:10]} - {articles[0]['タイトル'][:25]}...")
-    print(f"   最新: {articles[-1]['日付'][:10]} - {articles[-1]['タイトル'][:25]}...")
+    sheets = SheetsClient()
+    spreadsheet = sheets.spreadsheet
+    # シート構成は SheetsClient の index から（内部リンク分析の書き込みと共有）
+    worksheet = sheets.index.worksheet(SHEET_NAME)
+    if worksheet is None:
+        raise gspread.exceptions.WorksheetNotFound(SHEET_NAME)
+
+    # ID列だけ取得して記事ID→行番号の対応を作る
+    ids = worksheet.col_values(1)
+    row_of = {article_id: i for i, article_id in enumerate(ids, 1) if i > 1 and article_id}
+    next_row = max(len(ids), 1) + 1
+
+    # 前回書き込んだ内容のハッシュと比較して変更行を検出
+    written = local_store.load_json(ROW_STATE)
+    state = {}
+    changed = {}
+    appended = 0
+    for art in articles:
+        row = row_of.get(art['ID'])
+        if row is None:
+            row = next_row
+            next_row += 1
+            appended += 1
+
+        left, right = _row_values(art, row - 1)
+        digest = hashlib.md5(json.dumps(left + right, ensure_ascii=False).encode('utf-8')).hexdigest()
+        state[art['ID']] = digest
+        if written.get(art['ID']) != digest or art['ID'] not in row_of:
+            changed[row] = (left, right)
+
+    data = []
+    if not ids:
+        data.append({'range': absolute_range_name(SHEET_NAME, 'A1:O1'), 'values': [HEADER]})
+
+    for start, end in _row_runs(changed):
+        rows = [changed[r] for r in range(start, end + 1)]
+        data.append({'range': absolute_range_name(SHEET_NAME, f'A{start}:L{end}'), 'values': [r[0] for r in rows]})
+        data.append({'range': absolute_range_name(SHEET_NAME, f'N{start}:N{end}'), 'values': [r[1] for r in rows]})
+
+    # 公開一覧から消えた記事は行を残してステータスだけ変更
+    unpublished = 0
+    for article_id, row in row_of.items():
+        if article_id in state:
+            continue
+        state[article_id] = UNPUBLISHED
+        if written.get(article_id) != UNPUBLISHED:
+            data.append({'range': absolute_range_name(SHEET_NAME, f'D{row}'), 'values': [[UNPUBLISHED]]})
+            unpublished += 1
+
+    if data:
+        spreadsheet.values_batch_update({'valueInputOption': 'RAW', 'data': data})
+    local_store.save_json(ROW_STATE, state)
+
+    print(f"✅ 記事一覧を更新しました（{len(articles)}件中 更新{len(changed) - appended}件・追加{appended}件・非公開{unpublished}件）")
+    if articles:
+        print(f"   最古: {articles[0]['日付'][:10]} - {articles[0]['タイトル'][:25]}...")
+        print(f"   最新: {articles[-1]['日付'][:10]} - {articles[-1]['タイトル'][:25]}...")
+
+    # 内部リンクのグラフ分析（推奨リンク検討用）
+    profiler.stage('内部リンク分析')
+    print("[記事同期] 内部リンク分析中...")
+    links = analyze_links(posts, articles)
+    profiler.stage('内部リンク書き込み')
+    sheets.write_link_graph(links)
+    sheets.apply_formats()
+    print(f"✅ 内部リンク分析を更新しました（孤立記事 {int((links['孤立'] == '孤立').sum())}件）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WordPress記事一覧をスプレッドシートに同期')
+    parser.add_argument('--profile', action='store_true', help='段階ごとの時間・メモリ・CPUサンプルを記録')
+    parser.add_argument('--no-cache', action='store_true', help='APIレスポンスのキャッシュを使わない')
+    parser.add_argument('--refresh-cache', action='store_true', help='保存済みのAPIレスポンスを破棄して取り直す')
+    args = parser.parse_args()
+
+    response_cache.configure(bypass=args.no_cache, refresh=args.refresh_cache)
+
+    profiler = Profiler('sync_articles', enabled=args.profile)
+    try:
+        sync_articles(profiler)
+    finally:
+        profiler.finish()
 
 
 if __name__ == '__main__':
-    sync_articles()
+    main()
@@ -0,0 +1,208 @@
+"""
+Trend Engine
+日別指標の移動合計・EWMA・前週比・前年比・異常値フラグを差分更新で計算
+
+計算結果はローカルに保存し、新しい日（または速報値が確定して値が変わった日）以降だけを
+再計算する。各日の更新は前日の集計値と 7/28/364 日前の値を参照するだけなので、
+履歴を走査しない。当日・速報値の日は集計しない（確定後の実行で追加される）
+"""
+
+import math
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import config
+import local_store
+
+STATE = 'trend_state'
+
+# 指標の列名 → 表示名
+METRICS = {
+    'screenPageViews': 'PV',
+    'clicks': 'クリック',
+    'impressions': '表示回数',
+}
+
+EWMA_ALPHA = 2 / (7 + 1)  # 7日EWMA
+Z_THRESHOLD = 3.0  # 28日平均から標準偏差の何倍離れたら異常とするか
+Z_MIN_DAYS = 14  # zスコアの計算に必要な最低日数
+
+
+def _value(state, date, col):
+    """指定日の値（なければ NaN）"""
+    if date in state.index:
+        return state.at[date, col]
+    return np.nan
+
+
+def _nz(value):
+    return 0.0 if math.isnan(value) else value
+
+
+def _pct_change(current, previous):
+    if math.isnan(previous) or previous == 0:
+        return np.nan
+    return round((current / previous - 1) * 100, 1)
+
+
+def _first_changed_date(state, incoming):
+    """状態と比べて値が変わった（または新しい）最初の日"""
+    if state.empty:
+        return incoming.index.min()
+
+    known = state.reindex(incoming.index)[list(METRICS)]
+    same = np.isclose(incoming.to_numpy(dtype=float), known.to_numpy(dtype=float), equal_nan=True)
+    changed = incoming.index[~same.all(axis=1)]
+    return changed.min() if len(changed) else None
+
+
+def _last_final_date(ga_daily, gsc_daily):
+    """GA4・GSCとも値が確定している最後の日
+
+    GA4は直近 GA4_FINAL_LAG_DAYS 日（当日を含む）、GSCは直近 GSC_FINAL_LAG_DAYS 日と
+    速報値（provisional）の日を未確定とする。部分的な値でzスコアを計算すると急減と判定されるため
+    """
+    today = pd.Timestamp(datetime.now().date())
+    ends = []
+    if not ga_daily.empty:
+        ends.append(today - pd.Timedelta(days=max(config.GA4_FINAL_LAG_DAYS, 1)))
+    if not gsc_daily.empty:
+        end = today - pd.Timedelta(days=max(config.GSC_FINAL_LAG_DAYS, 1))
+        if 'provisional' in gsc_daily.columns:
+            provisional = gsc_daily['provisional'].fillna(False).astype(bool)
+            if provisional.any():
+                end = min(end, pd.to_datetime(gsc_daily.loc[provisional, 'date']).min() - pd.Timedelta(days=1))
+        ends.append(end)
+    return min(ends)
+
+
+def update_trends(ga_daily, gsc_daily):
+    """日別データを取り込んでトレンド集計を更新し、全期間の集計結果を返す
+
+    集計するのは確定した日まで（_last_final_date）。以前の実行で速報値の日を集計していた場合は削除する
+    """
+    frames = []
+    if not ga_daily.empty:
+        frames.append(ga_daily.set_index(pd.to_datetime(ga_daily['date']))[['screenPageViews']])
+    if not gsc_daily.empty:
+        frames.append(gsc_daily.set_index(pd.to_datetime(gsc_daily['date']))[['clicks', 'impressions']])
+    incoming = pd.concat(frames, axis=1).reindex(columns=list(METRICS)) if frames else pd.DataFrame()
+
+    state = local_store.read_frame(STATE)
+    if incoming.empty:
+        return state
+
+    final_end = _last_final_date(ga_daily, gsc_daily)
+    incoming = incoming[incoming.index <= final_end]
+    stale = not state.empty and state.index.max() > final_end
+    if stale:
+        state = state[state.index <= final_end]
+
+    start = _first_changed_date(state, incoming.astype(float)) if not incoming.empty else None
+    if start is None:
+        if stale:
+            local_store.write_frame(STATE, state)
+        return state
+
+    end = max(incoming.index.max(), state.index.max() if not state.empty else incoming.index.max())
+    # 再計算する日の元の値（状態にある値を取り込んだ値で上書き）
+    base = state.reindex(pd.date_range(start, end))[list(METRICS)] if not state.empty else None
+    if base is None:
+        base = pd.DataFrame(index=pd.date_range(start, end), columns=list(METRICS), dtype=float)
+    base.update(incoming.astype(float))
+
+    state = state[state.index < start] if not state.empty else state
+    new_rows = {}
+
+    def lookup(date, col):
+        if date in new_rows:
+            return new_rows[date][col]
+        return _value(state, date, col)
+
+    for date in base.index:
+        row = {}
+        prev = date - pd.Timedelta(days=1)
+        for m in METRICS:
+            x = base.at[date, m]
+            x = float(x) if pd.notna(x) else np.nan
+            row[m] = x
+
+            def ago(days, col=m):
+                return lookup(date - pd.Timedelta(days=days), col)
+
+            has_prev = prev in new_rows or prev in state.index
+            sum7 = (_nz(lookup(prev, f'{m}_sum7')) if has_prev else 0.0) + _nz(x) - _nz(ago(7))
+            sum28 = (_nz(lookup(prev, f'{m}_sum28')) if has_prev else 0.0) + _nz(x) - _nz(ago(28))
+            sq28 = (_nz(lookup(prev, f'{m}_sq28')) if has_prev else 0.0) + _nz(x) ** 2 - _nz(ago(28)) ** 2
+            cnt28 = ((_nz(lookup(prev, f'{m}_cnt28')) if has_prev else 0.0)
+                     + (0 if math.isnan(x) else 1) - (0 if math.isnan(ago(28)) else 1))
+            prev_ewma = lookup(prev, f'{m}_ewma') if has_prev else np.nan
+            if math.isnan(x):
+                ewma = prev_ewma
+            elif math.isnan(prev_ewma):
+                ewma = x
+            else:
+                ewma = EWMA_ALPHA * x + (1 - EWMA_ALPHA) * prev_ewma
+
+            # zスコアは前日までの28日間の平均・標準偏差と比べる
+            z = np.nan
+            prev_cnt = _nz(lookup(prev, f'{m}_cnt28')) if has_prev else 0.0
+            if not math.isnan(x) and prev_cnt >= Z_MIN_DAYS:
+                mean = lookup(prev, f'{m}_sum28') / prev_cnt
+                var = lookup(prev, f'{m}_sq28') / prev_cnt - mean ** 2
+                if var > 0:
+                    z = round((x - mean) / math.sqrt(var), 2)
+
+            row.update({
+                f'{m}_sum7': sum7,
+                f'{m}_sum28': sum28,
+                f'{m}_sq28': sq28,
+                f'{m}_cnt28': cnt28,
+                f'{m}_ewma': ewma,
+                f'{m}_wow': _pct_change(sum7, ago(7, f'{m}_sum7')),
+                f'{m}_yoy': _pct_change(sum7, ago(364, f'{m}_sum7')),
+                f'{m}_z': z,
+            })
+        new_rows[date] = row
+
+    updated = pd.DataFrame.from_dict(new_rows, orient='index')
+    state = pd.concat([state, updated]) if not state.empty else updated
+    state.index.name = 'date'
+    local_store.write_frame(STATE, state)
+    return state
+
+
+def trend_columns(state):
+    """トレンド分析シートに追加する表示用の列（日付 + 指標ごとの集計）"""
+    if state.empty:
+        return pd.DataFrame()
+
+    display = pd.DataFrame({'日付': state.index})
+    for m, label in METRICS.items():
+        display[f'{label}(7日計)'] = state[f'{m}_sum7'].to_numpy()
+        display[f'{label}(28日計)'] = state[f'{m}_sum28'].to_numpy()
+        display[f'{label}(EWMA)'] = state[f'{m}_ewma'].round(1).to_numpy()
+        display[f'{label}前週比(%)'] = state[f'{m}_wow'].to_numpy()
+        display[f'{label}前年比(%)'] = state[f'{m}_yoy'].to_numpy()
+        z = state[f'{m}_z'].to_numpy()
+        display[f'{label}異常'] = np.where(np.abs(np.nan_to_num(z)) >= Z_THRESHOLD, '異常', '')
+    return display
+
+
+def recent_anomalies(state, days=14):
+    """直近の異常値の一覧 [{date, metric, value, z}, ...]"""
+    if state.empty:
+        return []
+
+    recent = state[state.index > state.index.max() - pd.Timedelta(days=days)]
+    anomalies = []
+    for m, label in METRICS.items():
+        flagged = recent[recent[f'{m}_z'].abs() >= Z_THRESHOLD]
+        for date, value, z in zip(flagged.index, flagged[m], flagged[f'{m}_z']):
+            anomalies.append({
+                'date': date.strftime('%Y-%m-%d'),
+                'metric': label,
+                'value': int(value),
+                'z': float(z),
+            })
+    return sorted(anomalies, key=lambda a: a['date'], reverse=True)